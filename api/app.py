@@ -1,12 +1,32 @@
-from flask import Flask, render_template, redirect, url_for, request, session, jsonify
+from flask import Flask, render_template, redirect, url_for, request, session, jsonify, g, abort
 from blueprints.auth.routes import auth_bp
-from blueprints.dashboard.routes import dashboard_bp
+from blueprints.dashboard.routes import dashboard_bp, webhook_breaker
 from blueprints.admin.routes import admin_bp
-from blueprints.images.routes import images_bp, init_cache
+from blueprints.images.routes import images_bp
 from os import getenv
-import io
-from extensions import upload_to_gcs
-import requests
+from extensions import init_cache, logger
+from utils import generation_cache
+import time
+import hmac
+from utils.metrics import observe, render_prometheus
+from utils.profiling import init_profiling
+from utils.templates import init_template_cache
+from utils.assets import init_assets
+from utils.compression import init_compression
+from utils.rate_limit import rate_limit
+from utils.reconcile import init_reconcile
+from utils.image_variants import init_image_variants
+from utils.background import init_background
+from utils.ingest import ingest_batch, ingest_one, INGEST_MAX_ITEMS
+from utils.tracing import init_tracing, adopt_trace_id
+from utils.job_status import record_events
+
+def bearer_token_matches(name):
+    """True when the request carries the bearer token configured in env var `name`."""
+    token = getenv(name)
+    auth = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(auth, f"Bearer {token}")
+
 
 def create_app():
     app = Flask(__name__, template_folder="../templates", static_folder="../static")
@@ -17,13 +37,38 @@ def create_app():
     )
 
 
+    init_tracing(app)
+    init_template_cache(app)
+    init_assets(app)
     init_cache(app)
+    init_profiling(app)
+    init_compression(app)
+    init_reconcile(app)
+    init_image_variants(app)
+    init_background(app)
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(images_bp)
 
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - started,
+                endpoint=request.endpoint or "unmatched",
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
     @app.before_request
     def check_for_maintenance():
         if getenv("MAINTENANCE", "").upper() == "TRUE":
@@ -66,8 +111,37 @@ def create_app():
     @app.route("/health")
     def health_check():
         return "OK", 200
+
+    @app.route("/health/dependencies")
+    def dependency_health():
+        breaker = webhook_breaker.snapshot()
+        status = 200 if breaker["state"] != "open" else 503
+        return (
+            jsonify(
+                {
+                    "generation_webhook": breaker,
+                    "generation_cache": generation_cache.stats(),
+                }
+            ),
+            status,
+        )
     
+    @app.route("/metrics")
+    def metrics():
+        # Admins, or internal scrapers presenting METRICS_TOKEN as a bearer token.
+        token = getenv("METRICS_TOKEN")
+        auth = request.headers.get("Authorization", "")
+        authorized = session.get("is_admin") or (
+            token and hmac.compare_digest(auth, f"Bearer {token}")
+        )
+        if not authorized:
+            abort(404)
+        return render_prometheus(), 200, {
+            "Content-Type": "text/plain; version=0.0.4; charset=utf-8"
+        }
+
     @app.post("/upload")
+    @rate_limit("ingest", per_ip="600/minute", concurrency=16)
     def upload_file():
         try:
             image_url = request.form.get("image_url")
@@ -79,19 +153,71 @@ def create_app():
             if not folder or not filename:
                 return jsonify({"error": "Missing folder or filename"}), 400
 
-            response = requests.get(image_url, stream=True)
-            if response.status_code != 200:
-                return jsonify({"error": f"Failed to fetch image: {response.status_code}"}), 400
-
-            file_stream = io.BytesIO(response.content)
-
-            public_url = upload_to_gcs(file_stream, folder, filename)
+            # The workflow hands back the trace it was dispatched with.
+            trace_id = adopt_trace_id(request.form.get("trace_id"))
+            item = {
+                "image_url": image_url,
+                "folder": folder,
+                "filename": filename,
+                "trace_id": trace_id,
+                "submitted_at": request.form.get("submitted_at"),
+                "generated_at": request.form.get("generated_at"),
+            }
+            try:
+                public_url = ingest_one(item)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
 
             return jsonify({"url": public_url}), 200
 
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    @app.post("/upload/batch")
+    @rate_limit("ingest_batch", per_ip="120/minute", concurrency=4)
+    def upload_batch():
+        # Only enabled with INGEST_TOKEN, which callers present as a bearer token.
+        if not getenv("INGEST_TOKEN"):
+            abort(404)
+        if not bearer_token_matches("INGEST_TOKEN"):
+            return jsonify({"error": "Unauthorized"}), 401
+
+        items = (request.get_json(silent=True) or {}).get("items")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Expected a non-empty list of items"}), 400
+        if len(items) > INGEST_MAX_ITEMS:
+            return jsonify({"error": f"At most {INGEST_MAX_ITEMS} items per batch"}), 400
+
+        results = ingest_batch(items)
+        succeeded = sum(1 for r in results if r["success"])
+        status = 200 if succeeded == len(results) else (207 if succeeded else 400)
+        return jsonify({"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}), status
+
+    @app.post("/jobs/events")
+    def job_events():
+        """
+        Completion callback for the generation workflow. Accepts one event or
+        {"events": [...]} with id, email, status and optional message / url.
+        """
+        if not getenv("JOB_CALLBACK_TOKEN"):
+            abort(404)
+        if not bearer_token_matches("JOB_CALLBACK_TOKEN"):
+            return jsonify({"error": "Unauthorized"}), 401
+
+        data = request.get_json(silent=True)
+        events = data.get("events") if isinstance(data, dict) and "events" in data else [data]
+        if not isinstance(events, list) or not events or len(events) > 500:
+            return jsonify({"error": "Expected between 1 and 500 events"}), 400
+
+        try:
+            accepted, errors = record_events(events)
+        except Exception as e:
+            # Written through (no flush interval) and the write failed: the
+            # workflow must retry, nothing is kept for later.
+            logger.error(f"❌ Job status write failed: {e}")
+            return jsonify({"error": "Could not record the events, retry later"}), 503
+        return jsonify({"accepted": len(accepted), "errors": errors}), (202 if accepted else 400)
+
 
     return app
 
@@ -0,0 +1,508 @@
+"""
+In-process stand-ins for Supabase, the GCS bucket and the n8n webhook.
+
+They implement just the parts of each client API the blueprints call, keep
+everything in memory and sleep for a configurable latency on every call so
+the app's hot paths can be measured offline.
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from google.api_core.exceptions import NotFound
+
+from utils.metrics import track
+
+
+class Latency:
+    """Simulated per-call latency in seconds: mean +/- jitter."""
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0):
+        self.mean = mean
+        self.jitter = jitter
+
+    def sleep(self):
+        if self.mean <= 0:
+            return
+        time.sleep(max(self.mean + random.uniform(-self.jitter, self.jitter), 0))
+
+
+# --- Supabase ---
+
+
+class FakeResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+_OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+}
+
+
+def _split_top_level(text):
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current += ch
+    parts.append(current)
+    return parts
+
+
+def _parse_logic(kind, text):
+    conditions = []
+    for part in _split_top_level(text):
+        if part.startswith(("and(", "or(")):
+            inner_kind, _, inner = part.partition("(")
+            conditions.append(_parse_logic(inner_kind, inner[:-1]))
+            continue
+        column, op, value = part.split(".", 2)
+        value = value.strip('"')
+        conditions.append(
+            lambda row, c=column, o=op, v=value: row.get(c) is not None and _OPERATORS[o](str(row.get(c)), v)
+        )
+    combine = all if kind == "and" else any
+    return lambda row: combine(cond(row) for cond in conditions)
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.columns = None
+        self.count = None
+        self.payload = None
+        self.on_conflict = "id"
+        self.filters = []
+        self.ordering = []
+        self.bounds = None
+        self.row_limit = None
+
+    # Actions
+    def select(self, columns="*", count=None):
+        self.action, self.count = "select", count
+        if columns.strip() != "*":
+            self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict="id"):
+        self.action, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, values):
+        self.action, self.payload = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    # Filters and modifiers
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) <= value)
+        return self
+
+    def ilike(self, column, pattern):
+        needle = pattern.strip("%").lower()
+        self.filters.append(lambda row: needle in str(row.get(column) or "").lower())
+        return self
+
+    def or_(self, filters):
+        # PostgREST logic trees: "a.lt.1,and(a.eq.1,b.lt.2)" — enough for keyset cursors.
+        self.filters.append(_parse_logic("or", filters))
+        return self
+
+    def order(self, column, desc=False):
+        self.ordering.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def _matches(self, row):
+        return all(f(row) for f in self.filters)
+
+    def execute(self):
+        # Recorded like the real client's httpx hooks, so metrics and
+        # profiles show Supabase calls during a benchmark.
+        with track("supabase_table", f"{self.action} {self.table}"):
+            self.db.latency.sleep()
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+
+            if self.action in ("insert", "upsert"):
+                new_rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                stored = []
+                for new in new_rows:
+                    row = {"created_at": _now(), **new}
+                    if self.action == "upsert":
+                        keys = self.on_conflict.split(",")
+                        existing = next(
+                            (r for r in rows if all(r.get(k) == row.get(k) for k in keys)),
+                            None,
+                        )
+                        if existing is not None:
+                            existing.update(new)
+                            stored.append(dict(existing))
+                            continue
+                    rows.append(row)
+                    stored.append(dict(row))
+                return FakeResult(stored)
+
+            if self.action == "update":
+                updated = []
+                for row in rows:
+                    if self._matches(row):
+                        row.update(self.payload)
+                        updated.append(dict(row))
+                return FakeResult(updated)
+
+            if self.action == "delete":
+                deleted = [r for r in rows if self._matches(r)]
+                self.db.tables[self.table] = [r for r in rows if not self._matches(r)]
+                return FakeResult(deleted)
+
+            selected = [r for r in rows if self._matches(r)]
+            total = len(selected)
+            for column, desc in reversed(self.ordering):
+                selected.sort(key=lambda r: r.get(column) or "", reverse=desc)
+            if self.bounds:
+                selected = selected[self.bounds[0]: self.bounds[1] + 1]
+            if self.row_limit is not None:
+                selected = selected[: self.row_limit]
+            if self.columns:
+                selected = [{c: r.get(c) for c in self.columns} for r in selected]
+            else:
+                selected = [dict(r) for r in selected]
+            return FakeResult(selected, count=total if self.count else None)
+
+
+class FakeRpc:
+    """A call to one of the SQL functions in supabase/migrations."""
+
+    def __init__(self, db, name, params):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        with track("supabase_table", f"rpc {self.name}"):
+            self.db.latency.sleep()
+        with self.db.lock:
+            return FakeResult(_RPCS[self.name](self.db, **self.params))
+
+
+def _update_job_statuses(db, rows):
+    jobs = {(str(r.get("id")), r.get("email")): r for r in db.tables.setdefault("generated_images", [])}
+    updated = []
+    for row in rows:
+        job = jobs.get((row["id"], row["email"]))
+        if job is None:
+            continue
+        for field in ("status", "message", "url"):
+            if row.get(field) is not None:
+                job[field] = row[field]
+        updated.append({"id": row["id"]})
+    return updated
+
+
+_RPCS = {"update_job_statuses": _update_job_statuses}
+
+
+class FakeAdminAuth:
+    def __init__(self, db):
+        self.db = db
+
+    def _call(self, operation):
+        with track("supabase_auth", operation):
+            self.db.latency.sleep()
+
+    def _user(self, user_id):
+        user = self.db.users.get(user_id)
+        if user is None:
+            raise Exception("User not found")
+        return user
+
+    def get_user_by_id(self, user_id):
+        self._call("GET admin/users")
+        return SimpleNamespace(user=self._user(user_id))
+
+    def update_user_by_id(self, user_id, attributes):
+        self._call("PUT admin/users")
+        user = self._user(user_id)
+        with self.db.lock:
+            if "user_metadata" in attributes:
+                user.user_metadata = {**user.user_metadata, **attributes["user_metadata"]}
+            if attributes.get("email_confirm"):
+                user.confirmed_at = _now()
+        return SimpleNamespace(user=user)
+
+    def list_users(self, page=None, per_page=None):
+        self._call("GET admin/users")
+        users = list(self.db.users.values())
+        if page and per_page:
+            users = users[(page - 1) * per_page: page * per_page]
+        return users
+
+    def delete_user(self, user_id):
+        self._call("DELETE admin/users")
+        self.db.users.pop(user_id, None)
+
+
+class FakeSupabase:
+    """Stand-in for a supabase Client: table queries plus auth.admin."""
+
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.users = {}
+        self.auth = SimpleNamespace(admin=FakeAdminAuth(self))
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+    def add_user(self, email, **metadata):
+        user_id = str(uuid.uuid4())
+        self.users[user_id] = SimpleNamespace(
+            id=user_id,
+            email=email,
+            created_at=_now(),
+            confirmed_at=_now(),
+            last_sign_in_at=None,
+            user_metadata={"email": email, "email_verified": True, **metadata},
+        )
+        return user_id
+
+
+# --- Google Cloud Storage ---
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.size = None
+        self.md5_hash = None
+        self.updated = None
+
+    @property
+    def public_url(self):
+        return f"{self.bucket.public_base}/{self.name}"
+
+    def _store(self, data, content_type):
+        self.bucket.latency.sleep()
+        self.content_type = content_type
+        self.size = len(data)
+        self.md5_hash = str(hash(data))
+        self.updated = datetime.now(timezone.utc)
+        with self.bucket.lock:
+            self.bucket.objects[self.name] = (data, self)
+
+    def upload_from_file(self, file_stream, content_type=None, **kwargs):
+        self._store(file_stream.read(), content_type)
+
+    def upload_from_string(self, data, content_type="text/plain", **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._store(data, content_type)
+
+    def download_as_bytes(self, **kwargs):
+        self.bucket.latency.sleep()
+        with self.bucket.lock:
+            if self.name not in self.bucket.objects:
+                raise NotFound(f"No such object: {self.name}")
+            return self.bucket.objects[self.name][0]
+
+    def exists(self, **kwargs):
+        self.bucket.latency.sleep()
+        return self.name in self.bucket.objects
+
+    def delete(self, **kwargs):
+        self.bucket.latency.sleep()
+        with self.bucket.lock:
+            if self.bucket.objects.pop(self.name, None) is None:
+                raise NotFound(f"No such object: {self.name}")
+
+    def make_public(self, **kwargs):
+        self.bucket.latency.sleep()
+
+    def patch(self, **kwargs):
+        self.bucket.latency.sleep()
+
+    def generate_signed_url(self, **kwargs):
+        return f"{self.public_url}?X-Goog-Signature=fake"
+
+    def create_resumable_upload_session(self, **kwargs):
+        self.bucket.latency.sleep()
+        return f"{self.public_url}?upload_id=fake"
+
+
+class FakeBucket:
+    """Stand-in for a google.cloud.storage Bucket kept in memory."""
+
+    def __init__(self, latency: Latency = None, public_base: str = ""):
+        self.latency = latency or Latency()
+        self.public_base = public_base
+        self.lock = threading.Lock()
+        self.objects = {}  # {name: (bytes, FakeBlob)}
+
+    def blob(self, name):
+        return FakeBlob(self, name.strip("/"))
+
+    def get_blob(self, name, **kwargs):
+        self.latency.sleep()
+        with self.lock:
+            stored = self.objects.get(name.strip("/"))
+        return stored[1] if stored else None
+
+    def copy_blob(self, blob, destination_bucket, new_name=None, **kwargs):
+        data = blob.download_as_bytes()
+        copy = destination_bucket.blob(new_name or blob.name)
+        copy._store(data, self.objects[blob.name][1].content_type)
+        return copy
+
+    def list_blobs(self, prefix="", page_size=None, **kwargs):
+        self.latency.sleep()
+        with self.lock:
+            blobs = [b for name, (_, b) in sorted(self.objects.items()) if name.startswith(prefix)]
+        return iter(blobs)
+
+    def put(self, name, data, content_type="image/jpeg"):
+        self.blob(name)._store(data, content_type)
+
+
+# --- HTTP side: public object URLs and the generation webhook ---
+
+
+class StandInServer:
+    """
+    Threaded HTTP server for the calls the app makes over plain HTTP:
+    public object GETs under /secret-api/ and POSTs to /webhook/generate-image.
+    """
+
+    def __init__(self, bucket: FakeBucket, supabase: FakeSupabase, webhook_latency: Latency = None):
+        self.bucket = bucket
+        self.supabase = supabase
+        self.webhook_latency = webhook_latency or Latency()
+        self.webhook_calls = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                name = path[len("/secret-api/"):] if path.startswith("/secret-api/") else ""
+                with server.bucket.lock:
+                    stored = server.bucket.objects.get(name)
+                server.bucket.latency.sleep()
+                if not stored:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data, blob = stored
+                self.send_response(200)
+                self.send_header("Content-Type", blob.content_type or "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                server.webhook_latency.sleep()
+                server.webhook_calls += 1
+                try:
+                    payload = json.loads(body or b"{}")
+                    # Mirror n8n's CreateRow node.
+                    server.supabase.table("generated_images").insert(
+                        {
+                            "id": payload["id"],
+                            "email": payload["email"],
+                            "prompt": payload["prompt"],
+                            "status": "pending",
+                        }
+                    ).execute()
+                except (ValueError, KeyError):
+                    pass
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"message":"Workflow was started"}')
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,321 @@
+"""
+Load and benchmark harness for the app's hot paths.
+
+Starts create_app() against the in-process fakes in bench/fakes.py, drives a
+weighted mix of realistic requests from several worker threads and reports
+throughput and p50/p95/p99 latency per scenario.
+
+    python -m bench.run --duration 20 --concurrency 8
+    python -m bench.run --mix gallery=10,jobs_page=5 --supabase-latency 0.03
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from bench.fakes import FakeBucket, FakeSupabase, Latency, StandInServer
+
+DEFAULT_MIX = {
+    "gallery": 50,
+    "jobs_page": 25,
+    "submit": 10,
+    "bulk_delete": 10,
+    "zip_export": 5,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--concurrency", type=int, default=4, help="worker threads")
+    parser.add_argument("--mix", default=None, help="e.g. gallery=50,jobs_page=25,submit=10")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--jobs-per-user", type=int, default=60)
+    parser.add_argument("--image-kb", type=int, default=64, help="approximate size of each seeded JPEG")
+    parser.add_argument("--supabase-latency", type=float, default=0.02)
+    parser.add_argument("--gcs-latency", type=float, default=0.01)
+    parser.add_argument("--webhook-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.3, help="fraction of each latency")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def parse_mix(value):
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown scenario '{name}'. Choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def write_service_account(directory):
+    """Write a throwaway service-account key so signing works offline."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode("utf-8")
+    path = os.path.join(directory, "credentials.json")
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "type": "service_account",
+                "project_id": "bench",
+                "private_key_id": "bench",
+                "private_key": pem,
+                "client_email": "bench@bench.iam.gserviceaccount.com",
+                "client_id": "0",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            },
+            f,
+        )
+    return path
+
+
+def build_app(args, workdir):
+    jitter = args.jitter
+    supabase = FakeSupabase(Latency(args.supabase_latency, args.supabase_latency * jitter))
+    bucket = FakeBucket(Latency(args.gcs_latency, args.gcs_latency * jitter))
+    server = StandInServer(
+        bucket, supabase, Latency(args.webhook_latency, args.webhook_latency * jitter)
+    ).start()
+    bucket.public_base = f"{server.base_url}/secret-api"
+
+    # A syntactically valid JWT; the real clients are replaced below.
+    dummy_key = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.bench"
+    os.environ.update(
+        {
+            "SUPABASE_URL": "http://127.0.0.1:9",
+            "SUPABASE_KEY": dummy_key,
+            "SUPABASE_ANON_KEY": dummy_key,
+            "GCS_CREDENTIALS_FILE": write_service_account(workdir),
+            "FLASK_KEY": "bench",
+            "STORAGE_LINK": f"{server.base_url}/secret-api/storage",
+            "GENERATION_WEBHOOK_URL": f"{server.base_url}/webhook/generate-image",
+            "IMAGE_DELIVERY": "proxy",
+            "MAINTENANCE": "FALSE",
+            # Measure the hot paths themselves, not the admission limits.
+            "RATE_LIMITS_ENABLED": "FALSE",
+        }
+    )
+
+    # Swap the fakes in before any blueprint binds the real clients.
+    import extensions
+
+    extensions.supabase_admin = supabase
+    extensions.supabase = supabase
+    extensions.bucket = bucket
+
+    from api.app import create_app
+
+    return create_app(), supabase, bucket, server
+
+
+def seed_image(rng, kb):
+    """
+    A decodable JPEG of roughly `kb` KB, so paths that open images (reference
+    resizing, variants) do real work. Noise barely compresses, which keeps
+    the size predictable. Random bytes without Pillow.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return bytes(rng.getrandbits(8) for _ in range(kb * 1024))
+    # Noise at quality 90 comes out at about 1 byte per pixel.
+    side = max(int((kb * 1024) ** 0.5), 16)
+    img = Image.frombytes("RGB", (side, side), bytes(rng.getrandbits(8) for _ in range(side * side * 3)))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def seed(supabase, bucket, args):
+    rng = random.Random(args.seed)
+    image = seed_image(rng, args.image_kb)
+    users = []
+    for n in range(args.users):
+        email = f"bench{n}@example.com"
+        user_id = supabase.add_user(email, credits=10**9, disabled="False")
+        jobs = [seed_job(supabase, bucket, email, image) for _ in range(args.jobs_per_user)]
+        images = []
+        for _ in range(3):
+            image_id = str(uuid.uuid4())
+            bucket.put(f"storage/{email}/my_images/{image_id}.jpeg", image)
+            supabase.table("my_images").insert({"email": email, "id": image_id}).execute()
+            images.append(image_id)
+        users.append({"id": user_id, "email": email, "jobs": jobs, "images": images})
+    return users, image
+
+
+def seed_job(supabase, bucket, email, image):
+    job_id = str(uuid.uuid4())
+    bucket.put(f"storage/{email}/generated_images/{job_id}.jpeg", image)
+    supabase.table("generated_images").insert(
+        {"id": job_id, "email": email, "prompt": "bench prompt", "status": "completed"}
+    ).execute()
+    return job_id
+
+
+class Worker(threading.Thread):
+    def __init__(self, app, user, supabase, bucket, image, mix, deadline, results, rng):
+        super().__init__(daemon=True)
+        self.app = app
+        self.user = user
+        self.supabase = supabase
+        self.bucket = bucket
+        self.image = image
+        self.mix = mix
+        self.deadline = deadline
+        self.results = results
+        self.rng = rng
+
+    def run(self):
+        client = self.app.test_client()
+        # Session cookies are Secure, so talk to the app over "https".
+        client.environ_base["wsgi.url_scheme"] = "https"
+        with client.session_transaction() as sess:
+            sess["user"] = self.user["email"]
+            sess["user_id"] = self.user["id"]
+            sess["realtime"] = True
+
+        names, weights = zip(*self.mix.items())
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            status = getattr(self, f"scenario_{name}")(client)
+            self.results.append((name, time.perf_counter() - started, status))
+
+    def scenario_gallery(self, client):
+        job_id = self.rng.choice(self.user["jobs"])
+        resp = client.get(f"/images/{self.user['email']}/generated_images/{job_id}.jpeg")
+        return resp.status_code
+
+    def scenario_jobs_page(self, client):
+        pages = max(len(self.user["jobs"]) // 12, 1)
+        resp = client.get(f"/dashboard/jobs/?page={self.rng.randint(1, pages)}")
+        return resp.status_code
+
+    def scenario_submit(self, client):
+        resp = client.post(
+            "/dashboard/",
+            json={
+                "prompt": f"bench prompt {self.rng.random()}",
+                "repeat": 2,
+                "images": self.user["images"],
+                "width": 1024,
+                "height": 1024,
+                "type": "Professional",
+            },
+        )
+        return resp.status_code
+
+    def scenario_bulk_delete(self, client):
+        victims = self.rng.sample(self.user["jobs"], min(5, len(self.user["jobs"])))
+        resp = client.post("/dashboard/jobs/", json={"job_ids": victims})
+        # Put the deleted jobs back so the data set stays the same size.
+        for job_id in victims:
+            self.user["jobs"].remove(job_id)
+            self.user["jobs"].append(seed_job(self.supabase, self.bucket, self.user["email"], self.image))
+        return resp.status_code
+
+    def scenario_zip_export(self, client):
+        resp = client.post("/dashboard/jobs/download")
+        resp.get_data()
+        return resp.status_code
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def report(results, elapsed, as_json=False):
+    by_name = {}
+    for name, latency, status in results:
+        entry = by_name.setdefault(name, {"latencies": [], "errors": 0})
+        entry["latencies"].append(latency)
+        if status >= 400:
+            entry["errors"] += 1
+
+    rows = []
+    for name, entry in sorted(by_name.items()):
+        lat = entry["latencies"]
+        rows.append(
+            {
+                "scenario": name,
+                "requests": len(lat),
+                "errors": entry["errors"],
+                "rps": round(len(lat) / elapsed, 2),
+                "p50_ms": round(percentile(lat, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(lat, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(lat, 0.99) * 1000, 1),
+            }
+        )
+    total = {"requests": len(results), "seconds": round(elapsed, 2), "rps": round(len(results) / elapsed, 2)}
+
+    if as_json:
+        print(json.dumps({"scenarios": rows, "total": total}, indent=2))
+        return
+
+    header = f"{'scenario':<12} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['scenario']:<12} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8} "
+            f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}"
+        )
+    print("-" * len(header))
+    print(f"{'total':<12} {total['requests']:>9} {'':>7} {total['rps']:>8}   in {total['seconds']}s")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app, supabase, bucket, server = build_app(args, workdir)
+        users, image = seed(supabase, bucket, args)
+
+        results = []
+        rng = random.Random(args.seed)
+        deadline = time.monotonic() + args.duration
+        workers = [
+            Worker(
+                app, users[i % len(users)], supabase, bucket, image, mix,
+                deadline, results, random.Random(rng.random()),
+            )
+            for i in range(args.concurrency)
+        ]
+        started = time.monotonic()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.monotonic() - started
+        server.stop()
+
+    report(results, elapsed, as_json=args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+First-render latency of the dashboard pages, with and without the Jinja
+bytecode cache.
+
+Every run is a fresh process (like a serverless cold start) that renders
+each page once and reports how long that first request took.
+
+    python -m bench.templates --runs 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGES = ["/dashboard/", "/dashboard/jobs/", "/dashboard/basket/", "/dashboard/profile/", "/faq", "/pricing"]
+
+
+def child():
+    """Runs inside a fresh interpreter; prints {page: seconds} as JSON."""
+    from bench.run import build_app, parse_args, seed
+
+    args = parse_args(["--users", "1", "--jobs-per-user", "24", "--supabase-latency", "0",
+                       "--gcs-latency", "0", "--webhook-latency", "0"])
+    with tempfile.TemporaryDirectory() as workdir:
+        app, supabase, bucket, server = build_app(args, workdir)
+        users, _ = seed(supabase, bucket, args)
+        user = users[0]
+
+        client = app.test_client()
+        client.environ_base["wsgi.url_scheme"] = "https"
+        with client.session_transaction() as sess:
+            sess["user"] = user["email"]
+            sess["user_id"] = user["id"]
+            sess["realtime"] = True
+
+        timings = {}
+        for page in PAGES:
+            started = time.perf_counter()
+            client.get(page)
+            timings[page] = time.perf_counter() - started
+        server.stop()
+    print(json.dumps(timings))
+
+
+def run_child(env):
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.templates", "--child"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def precompile(env):
+    code = (
+        "import tempfile\n"
+        "from bench.run import build_app, parse_args\n"
+        "app, *_ = build_app(parse_args([]), tempfile.mkdtemp())\n"
+        "from utils.templates import precompile_templates\n"
+        "print(precompile_templates(app))\n"
+    )
+    subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, check=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold_env = {**os.environ, "JINJA_BYTECODE_CACHE": "FALSE"}
+        warm_env = {**os.environ, "JINJA_BYTECODE_CACHE": "TRUE", "JINJA_CACHE_DIR": cache_dir}
+        precompile(warm_env)
+
+        results = {"no cache": [], "bytecode cache": []}
+        for _ in range(args.runs):
+            results["no cache"].append(run_child(cold_env))
+            results["bytecode cache"].append(run_child(warm_env))
+
+    print(f"{'page':<22} {'no cache ms':>12} {'bytecode ms':>12} {'speedup':>8}")
+    for page in PAGES:
+        cold = min(r[page] for r in results["no cache"]) * 1000
+        warm = min(r[page] for r in results["bytecode cache"]) * 1000
+        print(f"{page:<22} {cold:>12.1f} {warm:>12.1f} {cold / warm if warm else 0:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, session
+from flask import Blueprint, render_template, redirect, url_for, request, flash, session, abort, jsonify
 from extensions import supabase_admin
+from utils.profiling import list_profiles, get_profile
+from utils.analytics import usage_summary
+from utils.admin_bulk import run_bulk, select_user_ids, BulkError, DESTRUCTIVE_ACTIONS
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -115,3 +118,77 @@ def update_credits():
         flash(f"Error updating credits: {str(e)}", "danger")
 
     return redirect(url_for("admin.home"))
+
+
+@admin_bp.post("/bulk")
+@login_required_admin
+def bulk():
+    """
+    JSON: {"action": ..., "user_ids": [...] or "filter": {...}, "credits": n,
+    "dry_run": bool, "confirm": n}. Returns each user's result and new
+    table row.
+
+    set_credits, disable and delete refuse an empty filter. Deleting by
+    filter also needs "confirm" set to the number of users a dry run
+    matched, so the filter cannot silently match more than was reviewed.
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get("action")
+    actor_id = session.get("user_id")
+    try:
+        user_ids = data.get("user_ids")
+        by_filter = user_ids is None and isinstance(data.get("filter"), dict)
+        if by_filter:
+            filters = {key: value for key, value in data["filter"].items() if value not in (None, "")}
+            if not filters and action in DESTRUCTIVE_ACTIONS and not data.get("dry_run"):
+                raise BulkError(f"'{action}' needs a non-empty filter or explicit user_ids")
+            user_ids = select_user_ids(filters, actor_id)
+        if not isinstance(user_ids, list):
+            raise BulkError("Provide user_ids or a filter")
+        if data.get("dry_run"):
+            return jsonify({"success": True, "matched": len(user_ids), "user_ids": user_ids})
+        if by_filter and action == "delete" and data.get("confirm") != len(user_ids):
+            raise BulkError(
+                f"Deleting by filter needs confirm set to the dry-run count; the filter matches {len(user_ids)} user(s)"
+            )
+        results = run_bulk(action, user_ids, {"credits": data.get("credits")}, actor_id=actor_id)
+    except BulkError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    succeeded = sum(1 for result in results if result["success"])
+    return jsonify(
+        {
+            "success": succeeded == len(results),
+            "action": action,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results,
+        }
+    ), (200 if succeeded == len(results) else 207)
+
+
+@admin_bp.get("/profiles")
+@login_required_admin
+def profiles():
+    return render_template("admin/profiles.html", profiles=list_profiles(), profile=None)
+
+
+@admin_bp.get("/profiles/<profile_id>")
+@login_required_admin
+def profile_detail(profile_id):
+    profile = get_profile(profile_id)
+    if not profile:
+        abort(404)
+    return render_template("admin/profiles.html", profiles=list_profiles(), profile=profile)
+
+
+@admin_bp.get("/analytics")
+@login_required_admin
+def analytics():
+    days = min(max(request.args.get("days", 30, type=int), 1), 365)
+    error = None
+    try:
+        summary = usage_summary(days)
+    except Exception as e:
+        summary, error = None, f"Error loading usage rollups: {str(e)}"
+    return render_template("admin/analytics.html", summary=summary, days=days, error=error)
@@ -13,6 +13,8 @@ from extensions import *
 from utils.supabase_helpers import user_exists
 from os import getenv
 from requests import post
+from utils.metrics import track
+from utils.rate_limit import rate_limit
 
 ADMIN_EMAIL = getenv("ADMIN_EMAIL")
 ADMIN_PASSWORD = getenv("ADMIN_PASSWORD")
@@ -90,6 +92,7 @@ def register_get():
 
 
 @auth_bp.post("/register")
+@rate_limit("register", per_ip="5/hour")
 def register_post():
     data = request.get_json() or request.form
 
@@ -109,7 +112,8 @@ def register_post():
             "response": hcaptcha_token,
             "remoteip": request.remote_addr,
         }
-        resp = post(verify_url, data=payload).json()
+        with track("hcaptcha", "siteverify"):
+            resp = post(verify_url, data=payload).json()
         if not resp.get("success"):
             return jsonify({"success": False, "message": "Captcha verification failed. Try again."}), 400
 
@@ -129,15 +133,6 @@ def register_post():
         if not user:
             return jsonify({"success": False, "message": "User registration failed."}), 500
 
-        try:
-            email = user.email
-            subfolders = ["my_images", "generated_images"]
-            create_gcs_folder(f"/storage/{email}")
-            for sub in subfolders:
-                create_gcs_folder(f"/storage/{email}/{sub}")
-        except Exception as e:
-            print(f"pCloud storage setup error: {e}")
-
         return jsonify({"success": True, "message": "Registration successful! Please verify your email."}), 200
 
     except Exception as e:
@@ -211,10 +206,6 @@ def google_callback():
                 supabase_admin.auth.admin.update_user_by_id(
                     user.id, {"user_metadata": {"disabled": "True"}}
                 )
-                subfolders = ["my_images", "generated_images"]
-                create_gcs_folder(f"/storage/{user.email}")
-                for sub in subfolders:
-                    create_gcs_folder(f"/storage/{user.email}/{sub}")
         except Exception as e:
             print(f"pCloud storage setup error: {e}")
 
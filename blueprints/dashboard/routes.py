@@ -23,10 +23,36 @@ import httpx
 from extensions import *
 import requests
 from io import BytesIO
+import os
+import time
+from google.api_core.exceptions import NotFound
+from utils.circuit_breaker import CircuitBreaker
+from utils.idempotency import idempotent, get_idempotency_key
+from utils import generation_cache
+from utils.metrics import track, record_dependency
+from utils.rate_limit import rate_limit
+from utils.image_variants import delete_variants, image_src, image_sources, build_variants
+from utils.job_status import status_counts, invalidate_counts
+from utils.job_search import search_jobs, SearchError, FILTER_ARGS
+from utils.export_manifest import manifest_page, stream_archive, EXPORT_MAX_ITEMS
+from utils.reference_images import reference_urls, build_reference
+from utils.basket_import import (
+    start_url_import, start_archive_import, import_progress, normalize_image, BasketImportError,
+)
+from utils.background import background_task, defer
+from utils.tracing import current_trace_id, trace_headers, log_stage, now_iso
 
 dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
 
-STORAGE_LINK = "https://storage.googleapis.com/secret-api/storage"
+STORAGE_LINK = os.getenv(
+    "STORAGE_LINK", "https://storage.googleapis.com/secret-api/storage"
+)
+GENERATION_WEBHOOK_URL = os.getenv(
+    "GENERATION_WEBHOOK_URL",
+    "https://secret-api-gt36.onrender.com/webhook/generate-image",
+)
+
+webhook_breaker = CircuitBreaker("generation_webhook")
 
 def login_required(f):
     @wraps(f)
@@ -46,6 +72,40 @@ def login_required(f):
 
     return decorated_function
 
+@background_task
+def save_last_data(user_id, last_data):
+    """
+    Remember the last generation settings in user_metadata. Only this key is
+    sent (the Admin API merges user_metadata), so a credit update made in
+    the meantime is not overwritten.
+    """
+    supabase_admin.auth.admin.update_user_by_id(
+        user_id, {"user_metadata": {"last_data": last_data}}
+    )
+
+
+@background_task
+def purge_images(blob_paths):
+    """
+    Delete stored images and everything derived from them, after their rows
+    are gone. Objects already removed are skipped, so retries are safe.
+    """
+    failed = 0
+    for path in blob_paths:
+        try:
+            with track("gcs", "delete"):
+                bucket.blob(path).delete()
+        except NotFound:
+            pass
+        except Exception as e:
+            logging.error(f"Failed to delete {path}: {e}")
+            failed += 1
+            continue
+        delete_variants(path)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(blob_paths)} image(s) not deleted")
+
+
 download_progress = {}  # simple in-memory dict: {email: {"current": X, "total": Y}}
 
 @dashboard_bp.get("/jobs/download/progress")
@@ -75,7 +135,8 @@ def home(user):
     images = [
         {
             "id": f["id"],
-            "url": f"{STORAGE_LINK}/{email}/my_images/{f['id']}.jpeg"
+            "url": image_src(f"{email}/my_images/{f['id']}.jpeg"),
+            "sources": image_sources(f"{email}/my_images/{f['id']}.jpeg"),
         }
         for f in all_files
     ]
@@ -93,6 +154,8 @@ def home(user):
 
 @dashboard_bp.post("/")
 @login_required
+@idempotent
+@rate_limit("generate", per_user="10/minute", per_ip="30/minute")
 def post_home(user):
     email = session["user"]
     user_id = session["user_id"]
@@ -124,21 +187,9 @@ def post_home(user):
             session["modified"] = True
 
     if session.get("modified", False):
-        resp = supabase_admin.auth.admin.get_user_by_id(user_id)
-        current_metadata = resp.user.user_metadata or {}
-        current_metadata["last_data"] = {
-            "last_prompt": prompt,
-            "last_selected_images": selected_images,
-            "last_width": width,
-            "last_height": height,
-            "last_repeat": repeat,
-            "last_resolution": data.get("resolution", "1:1-1K"),
-            "last_type": selected_type ,
-        }
-
-        supabase_admin.auth.admin.update_user_by_id(
-            user_id, {"user_metadata": current_metadata}
-        )
+        # The session already has these; the copy in user_metadata only
+        # restores them on the next login, so it can be written later.
+        defer(save_last_data, user_id, session_values)
 
     credits = int(user.get("credits") or 0)
 
@@ -148,30 +199,99 @@ def post_home(user):
     if credits <= 0:
         return jsonify({"error": "No credits left."}), 403
 
-    url = "https://secret-api-gt36.onrender.com/webhook/generate-image"
+    if repeat < 1:
+        return jsonify({"error": "Repeat must be at least 1."}), 400
+
+    model = "bytedance:5@0" if selected_type == "NSFW" else "google:4@2"
+
+    # Opt-in: reuse the output of an identical, already completed request.
+    cache_scope = data.get("cache")
+    cache_key = None
+    if cache_scope in generation_cache.SCOPES:
+        try:
+            cache_key = generation_cache.generation_cache_key(
+                cache_scope, email, prompt, selected_images, width, height, model
+            )
+            reused = reuse_cached_generation(cache_key, cache_scope, email, prompt, repeat, model)
+        except Exception as e:
+            logging.error(f"Generation cache lookup failed: {e}")
+            reused = None
+        if reused:
+            return jsonify(
+                {
+                    "message": f"{len(reused)} job(s) reused from a previous generation.",
+                    "cached": True,
+                    "jobs": reused,
+                }
+            )
+
+    if not webhook_breaker.allow():
+        retry_after = webhook_breaker.retry_after()
+        response = jsonify(
+            {"error": "Image generation is temporarily unavailable. Try again shortly."}
+        )
+        response.headers["Retry-After"] = str(retry_after)
+        return response, 503
+
+    url = GENERATION_WEBHOOK_URL
+    idempotency_key = get_idempotency_key()
+    timeout = webhook_breaker.timeout()
+
+    trace_id = current_trace_id()
+    dispatched = False
 
     async def send_request(payload):
+        nonlocal dispatched
+        dispatched = True
+        headers = trace_headers(trace_id) if trace_id else {}
+        if idempotency_key:
+            headers["Idempotency-Key"] = f"{idempotency_key}:{payload['id']}"
         async with httpx.AsyncClient() as client:
+            started = time.monotonic()
             try:
-                await client.post(url, json=payload, timeout=60)
+                resp = await client.post(
+                    url, json=payload, headers=headers, timeout=timeout
+                )
+                elapsed = time.monotonic() - started
+                if resp.status_code >= 500:
+                    webhook_breaker.record_failure(elapsed)
+                    record_dependency("n8n_webhook", "generate-image", elapsed, error=True)
+                    logging.error("Image generation failed: webhook returned %s", resp.status_code)
+                    log_stage("dispatched", trace_id, payload["id"], error=f"webhook returned {resp.status_code}",
+                              durations={"dispatch": elapsed})
+                    return False
+                webhook_breaker.record_success(elapsed)
+                record_dependency("n8n_webhook", "generate-image", elapsed)
+                log_stage("dispatched", trace_id, payload["id"], durations={"dispatch": elapsed})
                 return True
             except Exception as e:
+                elapsed = time.monotonic() - started
+                webhook_breaker.record_failure(elapsed)
+                record_dependency("n8n_webhook", "generate-image", elapsed, error=True)
                 logging.error(
                     "Image generation failed: %s\n%s", e, traceback.format_exc()
                 )
+                log_stage("dispatched", trace_id, payload["id"], error=e, durations={"dispatch": elapsed})
                 return False
 
+    job_ids = []
+
     async def send_multiple_requests():
         tasks = []
-        images = [
-            f"{STORAGE_LINK}/{email}/my_images/{id}.jpeg"
-            for id in selected_images
-        ]
-        for _ in range(repeat):
-            unique_id = str(uuid.uuid4())
+        for i in range(repeat):
+            if idempotency_key:
+                # Stable ids let the generation backend drop duplicate tasks.
+                unique_id = str(
+                    uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}:{idempotency_key}:{i}")
+                )
+            else:
+                unique_id = str(uuid.uuid4())
             payload = {
                 "email": email,
                 "id": unique_id,
+                "idempotency_key": idempotency_key,
+                "trace_id": trace_id,
+                "submitted_at": now_iso(),
                 "prompt": prompt,
                 "data": [
                     {
@@ -183,26 +303,33 @@ def post_home(user):
                         "height": height,
                         "outputType": ["URL"],
                         "referenceImages": images,
-                        "model": "bytedance:5@0" if selected_type == "NSFW" else "google:4@2",
+                        "model": model,
                         "positivePrompt": prompt,
                     }
                 ],
             }
-            print(payload)
+            log_stage("submit", trace_id, unique_id, model=model, width=width, height=height,
+                      references=len(images), prompt_chars=len(prompt or ""))
+            job_ids.append(unique_id)
             tasks.append(send_request(payload))
         return await asyncio.gather(*tasks)
 
-    results = asyncio.run(send_multiple_requests())
+    try:
+        # Resized copies sized for this output, not the full originals.
+        images = reference_urls(email, selected_images, width, height)
+        results = asyncio.run(send_multiple_requests())
+    finally:
+        if not dispatched:
+            # Nothing reached the webhook: free a half-open probe slot.
+            webhook_breaker.release()
 
     if all(results):
+        generation_cache.store(cache_key, email, job_ids)
+        invalidate_counts(email)
         new_credits = max(credits - repeat, 0)
         try:
-            resp = supabase_admin.auth.admin.get_user_by_id(user_id)
-            current_metadata = resp.user.user_metadata or {}
-            current_metadata["credits"] = new_credits
-
             supabase_admin.auth.admin.update_user_by_id(
-                user_id, {"user_metadata": current_metadata}
+                user_id, {"user_metadata": {"credits": new_credits}}
             )
             return jsonify({"message": f"{repeat} job(s) submitted successfully."})
         except Exception as e:
@@ -212,6 +339,66 @@ def post_home(user):
         return jsonify({"error": "Some jobs failed to submit."}), 500
 
 
+def reuse_cached_generation(cache_key, scope, email, prompt, repeat, model=None):
+    """
+    Return job ids satisfying the request from a cached generation, or None.
+
+    Outputs owned by the same user are reused as they are; outputs from
+    another user are copied into this user's generated_images.
+    """
+    entry = generation_cache.lookup(cache_key)
+    rows = []
+    if entry:
+        rows = (
+            supabase_admin.table("generated_images")
+            .select("id")
+            .eq("email", entry["email"])
+            .eq("status", "completed")
+            .in_("id", entry["job_ids"])
+            .execute()
+            .data
+            or []
+        )
+        if not rows:
+            # Outputs were deleted or never completed.
+            generation_cache.forget(cache_key)
+        if len(rows) < repeat:
+            entry = None
+
+    generation_cache.record(scope, hit=bool(entry))
+    if not entry:
+        return None
+
+    source_ids = [row["id"] for row in rows[:repeat]]
+    if entry["email"] == email:
+        return source_ids
+
+    copied = []
+    for source_id in source_ids:
+        new_id = str(uuid.uuid4())
+        source = bucket.blob(f"storage/{entry['email']}/generated_images/{source_id}.jpeg")
+        with track("gcs", "copy"):
+            blob = bucket.copy_blob(
+                source, bucket, f"storage/{email}/generated_images/{new_id}.jpeg"
+            )
+            if GCS_PUBLIC_UPLOADS:
+                blob.make_public()
+        copied.append(
+            {
+                "id": new_id,
+                "email": email,
+                "prompt": prompt,
+                "status": "completed",
+                "url": blob.public_url,
+                "model": model,
+            }
+        )
+
+    supabase_admin.table("generated_images").insert(copied).execute()
+    invalidate_counts(email)
+    return [row["id"] for row in copied]
+
+
 @dashboard_bp.get("/jobs/")
 @login_required
 def jobs(user):
@@ -223,31 +410,39 @@ def jobs(user):
     start = (page - 1) * per_page
     end = page * per_page - 1
 
-    response = (
-        supabase_admin.table("generated_images")
-        .select("status")
-        .eq("email", email)
-        .execute()
-    )
+    for key, value in status_counts(email).items():
+        session[key] = value
 
-    jobs = response.data if response.data else []
-    session["pending"] = len([job for job in jobs if job["status"] == "pending"])
-    session["failed"] = len([job for job in jobs if job["status"] == "failed"])
-    session["completed"] = len(
-        [job for job in jobs if job["status"] == "completed"]
-    )
-    session["total"] = session["pending"] + session["failed"] + session["completed"]
+    filters = {name: request.args.get(name, "").strip() for name in FILTER_ARGS}
+    cursor = request.args.get("cursor")
+    next_cursor = None
+    search_error = None
 
-    response = (
-        supabase_admin.table("generated_images")
-        .select("id, created_at, email, prompt, status, message")
-        .eq("email", email)
-        .order("created_at", desc=True)
-        .range(start, end)
-        .execute()
-    )
+    if any(filters.values()) or cursor:
+        try:
+            jobs, next_cursor = search_jobs(
+                email,
+                q=filters["q"],
+                status=filters["status"],
+                date_from=filters["from"],
+                date_to=filters["to"],
+                cursor=cursor,
+                limit=per_page,
+            )
+        except SearchError as e:
+            search_error = str(e)
+            jobs = []
+    else:
+        response = (
+            supabase_admin.table("generated_images")
+            .select("id, created_at, email, prompt, status, message")
+            .eq("email", email)
+            .order("created_at", desc=True)
+            .range(start, end)
+            .execute()
+        )
 
-    jobs = response.data if response.data else []
+        jobs = response.data if response.data else []
 
     return render_template(
         "dashboard/jobs.html",
@@ -255,24 +450,43 @@ def jobs(user):
         user=user,
         page=page,
         per_page=per_page,
+        filters=filters,
+        searching=any(filters.values()) or bool(cursor),
+        next_cursor=next_cursor,
+        search_error=search_error,
         storage_link=STORAGE_LINK
     )
 
 
+@dashboard_bp.get("/jobs/search")
+@login_required
+def jobs_search(user):
+    """
+    JSON search over the user's jobs: q (prompt text), status, from / to
+    (YYYY-MM-DD), limit and the cursor returned by the previous page.
+    """
+    try:
+        jobs, next_cursor = search_jobs(
+            session["user"],
+            q=request.args.get("q"),
+            status=request.args.get("status"),
+            date_from=request.args.get("from"),
+            date_to=request.args.get("to"),
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", 12, type=int),
+        )
+    except SearchError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({"success": True, "jobs": jobs, "next_cursor": next_cursor})
+
+
 @dashboard_bp.get("/jobs/count")
 @login_required
 def job_count(user):
     email = session["user"]
 
-    resp = (
-        supabase_admin.table("generated_images")
-        .select("id", count="exact")
-        .eq("email", email)
-        .eq("status", "completed")
-        .execute()
-    )
-
-    return jsonify({"total_completed": resp.count})
+    return jsonify({"total_completed": status_counts(email)["completed"]})
 
 
 @dashboard_bp.post("/jobs/")
@@ -292,28 +506,17 @@ def post_jobs(user):
             supabase_admin.table("generated_images").delete().eq("email", email).eq(
                 "id", job_id
             ).execute()
-            path = f"/storage/{email}/generated_images/{job_id}.jpeg"
-            delete_from_gcs(path)
-
             deleted_jobs.append(job_id)
         except Exception as e:
             errors.append({"job_id": job_id, "error": str(e)})
 
-    try:
-        response = (
-            supabase_admin.table("generated_images")
-            .select("status")
-            .eq("email", email)
-            .execute()
-        )
-        jobs = response.data if response.data else []
+    if deleted_jobs:
+        defer(purge_images, [f"storage/{email}/generated_images/{job_id}.jpeg" for job_id in deleted_jobs])
 
-        session["pending"] = len([job for job in jobs if job["status"] == "pending"])
-        session["failed"] = len([job for job in jobs if job["status"] == "failed"])
-        session["completed"] = len(
-            [job for job in jobs if job["status"] == "completed"]
-        )
-        session["total"] = session["pending"] + session["failed"] + session["completed"]
+    try:
+        invalidate_counts(email)
+        for key, value in status_counts(email).items():
+            session[key] = value
     except Exception as e:
         logging.error(f"Failed to update session counts: {e}")
 
@@ -349,18 +552,12 @@ def delete_all_jobs(user):
                 404,
             )
 
-        deleted_files = []
+        deleted_files = [f"storage/{email}/generated_images/{job_id}.jpeg" for job_id in job_ids]
         errors = []
 
-        for job_id in job_ids:
-            path = f"/{email}/generated_images/{job_id}.jpeg"
-            try:
-                delete_from_gcs(path)
-                deleted_files.append(path)
-            except Exception as e:
-                errors.append({"job_id": job_id, "error": str(e)})
-
         supabase_admin.table("generated_images").delete().eq("email", email).execute()
+        invalidate_counts(email)
+        defer(purge_images, deleted_files)
 
         session["total"] = 0
         session["pending"] = 0
@@ -389,6 +586,7 @@ def delete_all_jobs(user):
 
 @dashboard_bp.post("/jobs/download")
 @login_required
+@rate_limit("export", per_user="5/hour", concurrency_per_user=1, concurrency=4)
 def download_all_jobs(user):
     email = session["user"]
 
@@ -413,7 +611,8 @@ def download_all_jobs(user):
             for i, job_id in enumerate(completed_jobs, start=1):
                 image_url = f"{STORAGE_LINK}/{email}/generated_images/{job_id}.jpeg"
                 try:
-                    resp = requests.get(image_url, stream=True)
+                    with track("gcs", "fetch"):
+                        resp = requests.get(image_url, stream=True)
                     if resp.status_code == 200:
                         zf.writestr(f"{job_id}.jpeg", resp.content)
                 except Exception as e:
@@ -443,8 +642,16 @@ def download_all_jobs(user):
 @login_required
 def download_job(user, job_id):
     email = session["user"]
+    if IMAGE_DELIVERY == "signed":
+        signed_url, _ = generate_signed_url(
+            f"storage/{email}/generated_images/{job_id}.jpeg",
+            download_name=f"{job_id}.jpeg",
+        )
+        return redirect(signed_url, code=302)
+
     url = f"{STORAGE_LINK}/{email}/generated_images/{job_id}.jpeg"
-    resp = requests.get(url, stream=True)
+    with track("gcs", "fetch"):
+        resp = requests.get(url, stream=True)
     if resp.status_code != 200:
         return f"Failed to fetch image: {resp.status_code}", 404
 
@@ -455,6 +662,66 @@ def download_job(user, job_id):
         download_name=f"{job_id}.jpeg"
     )
 
+@dashboard_bp.get("/jobs/manifest")
+@login_required
+@rate_limit("export_manifest", per_user="120/minute")
+def jobs_manifest(user):
+    """
+    Completed jobs since `cursor` (or the `since` ISO timestamp), oldest
+    first, with download URLs, sizes and checksums for sync clients.
+    """
+    try:
+        items, next_cursor, has_more = manifest_page(
+            session["user"],
+            cursor=request.args.get("cursor"),
+            since=request.args.get("since"),
+            limit=request.args.get("limit", 200, type=int),
+        )
+    except SearchError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify(
+        {"success": True, "items": items, "next_cursor": next_cursor, "has_more": has_more}
+    )
+
+
+@dashboard_bp.get("/jobs/export")
+@login_required
+@rate_limit("export_delta", per_user="60/hour", concurrency_per_user=1, concurrency=4)
+def export_delta(user):
+    """
+    Stream a ZIP of the images completed since `cursor` / `since` (up to
+    EXPORT_MAX_ITEMS) with a manifest.json. X-Next-Cursor says where the
+    next export starts; X-Has-More says whether to fetch it right away.
+    """
+    email = session["user"]
+    cursor = request.args.get("cursor")
+    try:
+        items, next_cursor, has_more = manifest_page(
+            email, cursor=cursor, since=request.args.get("since"), limit=EXPORT_MAX_ITEMS
+        )
+    except SearchError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    headers = {"X-Next-Cursor": next_cursor or "", "X-Has-More": str(has_more).lower()}
+    if not items:
+        return Response(status=204, headers=headers)
+
+    manifest = {
+        "cursor": cursor,
+        "since": request.args.get("since"),
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "items": items,
+    }
+    headers["Content-Disposition"] = f'attachment; filename="jobs_{len(items)}.zip"'
+    return Response(
+        stream_archive(email, items, manifest),
+        mimetype="application/zip",
+        headers=headers,
+    )
+
+
 @dashboard_bp.get("/profile/")
 @login_required
 def profile(user):
@@ -497,7 +764,8 @@ def basket_get(user):
     images = [
         {
             "id": f["id"],
-            "url": f"{STORAGE_LINK}/{email}/my_images/{f['id']}.jpeg",
+            "url": image_src(f"{email}/my_images/{f['id']}.jpeg"),
+            "sources": image_sources(f"{email}/my_images/{f['id']}.jpeg"),
         }
         for f in all_files
     ]
@@ -507,6 +775,7 @@ def basket_get(user):
 
 @dashboard_bp.post("/basket/")
 @login_required
+@rate_limit("basket_upload", per_user="30/minute", per_ip="60/minute")
 def basket_post(user):
     email = session["user"]
     uploaded_files = request.files.getlist("new_images")
@@ -526,6 +795,8 @@ def basket_post(user):
             supabase_admin.table("my_images").insert(
                 {"email": email, "id": filename[:-5]}
             ).execute()
+            defer(build_reference, email, filename[:-5])
+            defer(build_variants, f"storage/{email}/my_images/{filename}")
 
             uploaded_ids.append(filename[:-5])
 
@@ -541,6 +812,167 @@ def basket_post(user):
     )
 
 
+@dashboard_bp.post("/basket/import")
+@login_required
+@rate_limit("basket_import", per_user="5/minute", per_ip="10/minute")
+def basket_import(user):
+    """
+    Start a server-side import into the basket from a JSON list of image
+    URLs ({"urls": [...]}) or an uploaded ZIP archive (form field "archive").
+    Returns the import's progress; poll the status URL until it completes.
+    """
+    email = session["user"]
+    archive = request.files.get("archive")
+    try:
+        if archive and archive.filename:
+            progress = start_archive_import(email, archive.stream)
+        else:
+            urls = (request.get_json(silent=True) or {}).get("urls")
+            progress = start_url_import(email, urls)
+    except BasketImportError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    progress["status_url"] = url_for("dashboard.basket_import_status", import_id=progress["id"])
+    return jsonify({"success": True, **progress}), 202
+
+
+@dashboard_bp.get("/basket/import/<import_id>")
+@login_required
+def basket_import_status(user, import_id):
+    progress = import_progress(session["user"], import_id)
+    if progress is None:
+        return jsonify({"success": False, "message": "Import not found"}), 404
+    return jsonify({"success": True, **progress})
+
+
+@dashboard_bp.post("/basket/uploads")
+@login_required
+@rate_limit("basket_upload", per_user="30/minute", per_ip="60/minute")
+def basket_upload_session(user):
+    """
+    Issue upload URLs so the browser can send basket images straight to GCS.
+    """
+    email = session["user"]
+    data = request.get_json(silent=True) or {}
+
+    try:
+        count = int(data.get("count", 0))
+    except (TypeError, ValueError):
+        count = 0
+    if count <= 0 or count > 10:
+        return jsonify({"success": False, "message": "Request between 1 and 10 uploads"}), 400
+
+    mode = data.get("mode", "signed")
+    if mode not in ("signed", "resumable"):
+        return jsonify({"success": False, "message": "Unknown upload mode"}), 400
+
+    # A resumable session is bound to its exact length, so the browser
+    # declares each file's size up front.
+    sizes = data.get("sizes")
+    if mode == "resumable":
+        if (
+            not isinstance(sizes, list)
+            or len(sizes) != count
+            or not all(isinstance(size, int) and 0 < size <= MAX_UPLOAD_BYTES for size in sizes)
+        ):
+            return jsonify({"success": False, "message": f"Provide each file's size, at most {MAX_UPLOAD_BYTES} bytes"}), 400
+
+    uploads = []
+    try:
+        for i in range(count):
+            image_id = str(uuid.uuid4())
+            blob_path = f"storage/{email}/my_images/{image_id}.jpeg"
+            if mode == "resumable":
+                upload_url = create_resumable_upload(
+                    blob_path, sizes[i], origin=request.headers.get("Origin")
+                )
+            else:
+                upload_url = generate_upload_url(blob_path)
+            uploads.append({"id": image_id, "upload_url": upload_url})
+    except Exception as e:
+        logging.error(f"Failed to create upload session: {e}")
+        return jsonify({"success": False, "message": "Could not start upload"}), 500
+
+    return jsonify(
+        {
+            "success": True,
+            "mode": mode,
+            "content_type": "image/jpeg",
+            # Signed PUTs must send exactly these headers.
+            "headers": upload_headers() if mode == "signed" else {"Content-Type": "image/jpeg"},
+            "uploads": uploads,
+        }
+    )
+
+
+@dashboard_bp.post("/basket/uploads/finalize")
+@login_required
+def basket_upload_finalize(user):
+    """
+    Verify the objects uploaded directly to GCS and record them in my_images.
+    """
+    email = session["user"]
+    image_ids = (request.get_json(silent=True) or {}).get("ids") or []
+
+    if not image_ids:
+        return jsonify({"success": False, "message": "No uploads to finalize"}), 400
+
+    finalized = []
+    errors = []
+
+    for image_id in image_ids:
+        try:
+            uuid.UUID(str(image_id))
+        except ValueError:
+            errors.append({"id": image_id, "error": "Invalid id"})
+            continue
+
+        with track("gcs", "get_blob"):
+            blob = bucket.get_blob(f"storage/{email}/my_images/{image_id}.jpeg")
+        if blob is None:
+            errors.append({"id": image_id, "error": "Upload not found"})
+            continue
+        try:
+            if not (blob.content_type or "").startswith("image/") or blob.size > MAX_UPLOAD_BYTES:
+                raise ValueError("Rejected file")
+            with track("gcs", "fetch"):
+                data = blob.download_as_bytes()
+            # The client chose the bytes and the Content-Type: decode them
+            # as an import would, storing a re-encoded JPEG when needed.
+            jpeg = normalize_image(data)
+        except ValueError as e:
+            try:
+                with track("gcs", "delete"):
+                    blob.delete()
+            except Exception as delete_error:
+                logging.error(f"Failed to delete rejected upload {blob.name}: {delete_error}")
+            errors.append({"id": image_id, "error": str(e)})
+            continue
+        if jpeg is not data:
+            with track("gcs", "upload"):
+                blob.upload_from_string(jpeg, content_type="image/jpeg")
+        if GCS_PUBLIC_UPLOADS:
+            blob.make_public()
+        finalized.append(str(image_id))
+        defer(build_reference, email, str(image_id))
+        defer(build_variants, blob.name)
+
+    if finalized:
+        # Upsert so a retried finalize does not fail on existing rows.
+        supabase_admin.table("my_images").upsert(
+            [{"email": email, "id": image_id} for image_id in finalized]
+        ).execute()
+
+    return jsonify(
+        {
+            "success": bool(finalized),
+            "message": f"Uploaded {len(finalized)} image(s) successfully.",
+            "uploaded": finalized,
+            "errors": errors,
+        }
+    ), (200 if finalized else 400)
+
+
 @dashboard_bp.delete("/basket/")
 @login_required
 def delete_image(user):
@@ -552,8 +984,6 @@ def delete_image(user):
         deleted = []
 
         for image_id in to_delete:
-            path = f"/storage/{email}/my_images/{image_id}.jpeg"
-            delete_from_gcs(path)
             result = (
                 supabase_admin.table("my_images")
                 .delete()
@@ -562,6 +992,8 @@ def delete_image(user):
                 .execute()
             )
             deleted.append(image_id)
+        if deleted:
+            defer(purge_images, [f"storage/{email}/my_images/{image_id}.jpeg" for image_id in deleted])
         return (
             jsonify(
                 {
@@ -1,18 +1,21 @@
-from flask import Blueprint, abort, session, current_app, make_response
-from extensions import supabase_admin
+from flask import Blueprint, abort, session, current_app, make_response, redirect
+from extensions import supabase_admin, IMAGE_DELIVERY, SIGNED_URL_MARGIN, generate_signed_url
+from utils.metrics import track
+from utils.image_variants import (
+    VARIANT_SOURCE, negotiate_formats, variant_exists, load_variant, variant_path,
+    image_src, image_sources, variant_types
+)
 from functools import wraps
 import requests
 import os
-from flask_caching import Cache
+import time
 
 STORAGE_LINK = os.getenv("STORAGE_LINK")
 
 images_bp = Blueprint("images", __name__, url_prefix="/images")
-
-cache = Cache(config={"CACHE_TYPE": "SimpleCache"})
-
-def init_cache(app):
-    cache.init_app(app)
+images_bp.add_app_template_global(image_src)
+images_bp.add_app_template_global(image_sources)
+images_bp.add_app_template_global(variant_types)
 
 def login_required(f):
     @wraps(f)
@@ -35,22 +38,57 @@ def login_required(f):
 @images_bp.route("/<path:path>")
 @login_required
 def proxy_image(user, path):
-    url = f"{STORAGE_LINK}/{path}"
-    resp = requests.get(url, stream=True)
-    if resp.status_code != 200:
-        abort(resp.status_code)
+    # Only the owner may read their objects, whichever way they are served:
+    # signed mode hands out a service-account signature and proxy mode
+    # fetches from the public STORAGE_LINK, neither of which checks the user.
+    if not path.startswith(f"{session.get('user')}/") or ".." in path.split("/"):
+        abort(403)
 
-    content = resp.content
-    content_type = resp.headers.get("Content-Type", "application/octet-stream")
+    blob_path = f"storage/{path}"
+    # Serve the best built AVIF/WebP variant the browser asks for (missing
+    # ones are queued, not encoded here); the JPEG stays the original.
+    variant = None
+    try:
+        if VARIANT_SOURCE.match(blob_path):
+            variant = next((f for f in negotiate_formats() if variant_exists(blob_path, f[0])), None)
+    except Exception as e:
+        current_app.logger.warning(f"Serving original for {path}: {e}")
+
+    if IMAGE_DELIVERY == "signed":
+        if variant:
+            blob_path = variant_path(blob_path, variant[0])
+        signed_url, expires_at = generate_signed_url(blob_path)
+        response = redirect(signed_url, code=302)
+        # The redirect may be reused while the signature is still valid,
+        # with some margin left for the browser to follow it.
+        max_age = int(min(300, expires_at - time.time() - SIGNED_URL_MARGIN))
+        response.headers["Cache-Control"] = f"private, max-age={max_age}" if max_age > 0 else "no-store"
+        response.vary.add("Accept")
+        return response
+
+    content = None
+    if variant:
+        try:
+            content = load_variant(blob_path, variant[0])
+            content_type = variant[1]
+        except Exception as e:
+            current_app.logger.warning(f"Serving original for {path}: {e}")
+
+    if content is None:
+        url = f"{STORAGE_LINK}/{path}"
+        with track("gcs", "fetch"):
+            resp = requests.get(url, stream=True)
+            content = resp.content
+        if resp.status_code != 200:
+            abort(resp.status_code)
+        content_type = resp.headers.get("Content-Type", "application/octet-stream")
 
     response = make_response(content)
     response.headers["Content-Type"] = content_type
+    response.vary.add("Accept")
 
-    # Allow browsers to cache for 10 minutes
-    response.headers["Cache-Control"] = "public, max-age=600, immutable"
-
-    # Optional CDN hints (Vercel may still skip because of cookies)
-    response.headers["CDN-Cache-Control"] = "public, max-age=600"
-    response.headers["Vercel-CDN-Cache-Control"] = "public, max-age=600"
+    # Per-user content: the browser may keep it for 10 minutes, shared
+    # caches must not.
+    response.headers["Cache-Control"] = "private, max-age=600, immutable"
 
     return response
\ No newline at end of file
@@ -1,9 +1,14 @@
 import logging
 import os
+import time
+from datetime import timedelta
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from flask_caching import Cache
 from google.cloud import storage
+from google.auth.credentials import AnonymousCredentials
 from google.oauth2 import service_account
+from utils.metrics import track, cache_result, instrument_httpx_client
 
 # Load environment variables
 load_dotenv()
@@ -12,6 +17,19 @@ load_dotenv()
 logger = logging.getLogger("dashboard")
 logger.setLevel(logging.INFO)
 
+# --- Cache setup ---
+# SimpleCache is per-process; set CACHE_TYPE=RedisCache and CACHE_REDIS_URL
+# to share cached state between workers.
+cache_config = {"CACHE_TYPE": os.getenv("CACHE_TYPE", "SimpleCache")}
+if os.getenv("CACHE_REDIS_URL"):
+    cache_config["CACHE_REDIS_URL"] = os.getenv("CACHE_REDIS_URL")
+cache = Cache(config=cache_config)
+
+
+def init_cache(app):
+    cache.init_app(app)
+
+
 # --- Supabase setup ---
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -20,25 +38,51 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+instrument_httpx_client(supabase_admin.auth._http_client, "supabase_auth")
+instrument_httpx_client(supabase_admin.postgrest.session, "supabase_table")
+instrument_httpx_client(supabase.auth._http_client, "supabase_auth")
+
 # --- Google Cloud Storage setup ---
 credentials = service_account.Credentials.from_service_account_file(
-    "./credentials.json"
+    os.getenv("GCS_CREDENTIALS_FILE", "./credentials.json")
 )
-client = storage.Client(credentials=credentials, project=credentials.project_id)
+# STORAGE_EMULATOR_HOST points the client at a local emulator (fake-gcs-server).
+STORAGE_EMULATOR_HOST = os.getenv("STORAGE_EMULATOR_HOST")
+if STORAGE_EMULATOR_HOST:
+    client = storage.Client(credentials=AnonymousCredentials(), project="test")
+else:
+    client = storage.Client(credentials=credentials, project=credentials.project_id)
 bucket = client.bucket("secret-api")
 
+# --- Image delivery ---
+# "proxy" streams bytes through Flask, "signed" redirects to a V4 signed URL.
+IMAGE_DELIVERY = os.getenv("IMAGE_DELIVERY", "proxy").lower()
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", 900))
+# Signed URLs are reused until this many seconds before they expire.
+SIGNED_URL_MARGIN = 60
+# Public ACLs are only needed while templates link to storage directly.
+GCS_PUBLIC_UPLOADS = os.getenv("GCS_PUBLIC_UPLOADS", "TRUE").upper() == "TRUE"
+
+signed_url_cache = {}  # {(blob_path, download_name): (url, expires_at)}
+
+# Direct browser uploads
+UPLOAD_URL_TTL = int(os.getenv("UPLOAD_URL_TTL", 900))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+
 
 # --- GCS Helper Functions ---
 
-def upload_to_gcs(file_stream, folder: str, filename: str):
+def upload_to_gcs(file_stream, folder: str, filename: str, content_type: str = "image/jpeg"):
     """
     Upload a file stream to Google Cloud Storage.
     """
     try:
         blob_path = f"{folder}/{filename}".strip("/")
         blob = bucket.blob(blob_path)
-        blob.upload_from_file(file_stream, content_type="image/jpeg")
-        blob.make_public()  # Optional — make files publicly accessible
+        with track("gcs", "upload"):
+            blob.upload_from_file(file_stream, content_type=content_type)
+            if GCS_PUBLIC_UPLOADS:
+                blob.make_public()  # Optional — make files publicly accessible
         logger.info(f"✅ Uploaded {filename} to GCS at {blob.public_url}")
         return blob.public_url
     except Exception as e:
@@ -53,7 +97,8 @@ def delete_from_gcs(filepath: str):
     try:
         blob_path = filepath.strip("/")
         blob = bucket.blob(blob_path)
-        blob.delete()
+        with track("gcs", "delete"):
+            blob.delete()
         logger.info(f"🗑️ Deleted {blob_path} from GCS")
         return True
     except Exception as e:
@@ -61,15 +106,79 @@ def delete_from_gcs(filepath: str):
         return False
 
 
-def create_gcs_folder(folder_path: str):
+def generate_signed_url(blob_path: str, download_name: str = None):
     """
-    Create a logical folder in GCS (optional, just creates a placeholder).
+    Return (url, expires_at) for a short-lived V4 signed GET URL of a blob,
+    signed locally with the service account key. URLs are cached until
+    shortly before they expire, so `expires_at` (a Unix time) may be as
+    little as SIGNED_URL_MARGIN seconds away.
     """
-    try:
-        blob = bucket.blob(f"{folder_path.strip('/')}/.placeholder")
-        blob.upload_from_string("")
-        logger.info(f"📁 Created folder placeholder at {folder_path}")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Failed to create folder: {e}")
-        return False
+    blob_path = blob_path.strip("/")
+    key = (blob_path, download_name)
+    now = time.time()
+
+    cached = signed_url_cache.get(key)
+    if cached and cached[1] - now > SIGNED_URL_MARGIN:
+        cache_result("signed_url", True)
+        return cached
+    cache_result("signed_url", False)
+
+    disposition = None
+    if download_name:
+        disposition = f'attachment; filename="{download_name}"'
+
+    url = bucket.blob(blob_path).generate_signed_url(
+        version="v4",
+        expiration=timedelta(seconds=SIGNED_URL_TTL),
+        method="GET",
+        credentials=credentials,
+        response_disposition=disposition,
+    )
+
+    # Drop expired entries so the cache stays bounded by live URLs.
+    if len(signed_url_cache) > 10000:
+        for stale in [k for k, v in signed_url_cache.items() if v[1] <= now]:
+            signed_url_cache.pop(stale, None)
+
+    signed_url_cache[key] = (url, now + SIGNED_URL_TTL)
+    return signed_url_cache[key]
+
+
+def upload_headers(content_type: str = "image/jpeg"):
+    """Headers a PUT to a generate_upload_url URL must send, as signed."""
+    return {
+        "Content-Type": content_type,
+        # GCS rejects a body outside this range, so nothing larger is stored.
+        "x-goog-content-length-range": f"0,{MAX_UPLOAD_BYTES}",
+    }
+
+
+def generate_upload_url(blob_path: str, content_type: str = "image/jpeg"):
+    """
+    Return a V4 signed PUT URL the browser can upload a single object to.
+    The upload must send upload_headers(content_type).
+    """
+    kwargs = {}
+    if STORAGE_EMULATOR_HOST:
+        kwargs["api_access_endpoint"] = STORAGE_EMULATOR_HOST
+    headers = upload_headers(content_type)
+    return bucket.blob(blob_path.strip("/")).generate_signed_url(
+        version="v4",
+        expiration=timedelta(seconds=UPLOAD_URL_TTL),
+        method="PUT",
+        content_type=content_type,
+        headers={"x-goog-content-length-range": headers["x-goog-content-length-range"]},
+        credentials=credentials,
+        **kwargs,
+    )
+
+
+def create_resumable_upload(blob_path: str, size: int, content_type: str = "image/jpeg", origin: str = None):
+    """
+    Start a resumable upload session and return its session URL. The browser
+    PUTs the bytes (optionally in chunks) straight to that URL; GCS fails
+    the upload if they add up to anything but `size`.
+    """
+    blob = bucket.blob(blob_path.strip("/"))
+    with track("gcs", "create_resumable_upload"):
+        return blob.create_resumable_upload_session(content_type=content_type, size=size, origin=origin)
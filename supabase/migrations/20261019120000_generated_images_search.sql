@@ -0,0 +1,16 @@
+-- Prompt search and keyset pagination for the jobs page (dashboard.jobs,
+-- /dashboard/jobs/search). Apply with `supabase db push` or the SQL editor.
+
+create extension if not exists pg_trgm;
+
+-- ILIKE '%words%' on prompt.
+create index if not exists generated_images_prompt_trgm_idx
+    on public.generated_images using gin (prompt gin_trgm_ops);
+
+-- A user's jobs newest first, and the (created_at, id) cursor.
+create index if not exists generated_images_email_created_idx
+    on public.generated_images (email, created_at desc, id desc);
+
+-- Status filter without scanning the whole history.
+create index if not exists generated_images_email_status_created_idx
+    on public.generated_images (email, status, created_at desc, id desc);
@@ -0,0 +1,84 @@
+-- Usage rollups for the admin analytics view (/admin/analytics).
+-- A trigger on generated_images keeps them current for every writer (the app
+-- and the n8n workflow), so the view never scans the job history.
+
+alter table public.generated_images add column if not exists model text;
+
+create table if not exists public.usage_rollups (
+    day     date   not null,
+    email   text   not null,
+    model   text   not null,
+    status  text   not null,
+    jobs    bigint not null default 0,
+    -- One credit per job dispatched to the generator (rows created pending),
+    -- booked under the status the row was created with.
+    credits bigint not null default 0,
+    primary key (day, email, model, status)
+);
+
+create index if not exists usage_rollups_day_idx on public.usage_rollups (day);
+
+alter table public.usage_rollups enable row level security;
+
+-- Both functions run as their owner: the trigger fires for every writer of
+-- generated_images (including roles other than the service role, such as
+-- the n8n workflow's), and only the owner may write the RLS-protected
+-- rollups. The empty search_path keeps callers from substituting objects;
+-- every name below is schema-qualified.
+create or replace function public.bump_usage_rollup(
+    p_day date, p_email text, p_model text, p_status text, p_jobs bigint, p_credits bigint
+) returns void language sql
+security definer set search_path = '' as $$
+    insert into public.usage_rollups as r (day, email, model, status, jobs, credits)
+    values (p_day, p_email, coalesce(p_model, 'unknown'), coalesce(p_status, 'pending'), p_jobs, p_credits)
+    on conflict (day, email, model, status) do update
+        set jobs = r.jobs + excluded.jobs,
+            credits = r.credits + excluded.credits;
+$$;
+
+create or replace function public.generated_images_rollup() returns trigger
+language plpgsql security definer set search_path = '' as $$
+declare
+    charged bigint;
+begin
+    if tg_op = 'INSERT' then
+        -- Submissions arrive pending; rows inserted completed are reused outputs.
+        charged := case when coalesce(new.status, 'pending') = 'pending' then 1 else 0 end;
+        perform public.bump_usage_rollup(
+            new.created_at::date, new.email, new.model, new.status, 1, charged);
+    elsif new.status is distinct from old.status or new.model is distinct from old.model then
+        -- Move the job to its new bucket on its original day. Credits stay
+        -- where they were charged; summed over statuses they are the spend.
+        perform public.bump_usage_rollup(
+            old.created_at::date, old.email, old.model, old.status, -1, 0);
+        perform public.bump_usage_rollup(
+            old.created_at::date, old.email, new.model, new.status, 1, 0);
+    end if;
+    -- Deletes leave the rollups alone: they describe usage, not current rows.
+    return null;
+end;
+$$;
+
+-- Only the trigger should bump rollups, not API callers.
+revoke execute on function public.bump_usage_rollup(date, text, text, text, bigint, bigint)
+    from public, anon, authenticated;
+
+-- Backfill the existing history, then attach the trigger, with writers
+-- blocked in between so no job is counted twice or missed. Only runs into
+-- an empty table, so re-applying the migration does not double the counts.
+-- The history does not record what each row was created as, so every
+-- existing job is booked as one credit.
+lock table public.generated_images in share row exclusive mode;
+
+insert into public.usage_rollups (day, email, model, status, jobs, credits)
+select created_at::date, email, coalesce(model, 'unknown'), coalesce(status, 'pending'),
+       count(*), count(*)
+from public.generated_images
+where email is not null
+  and not exists (select 1 from public.usage_rollups)
+group by created_at::date, email, coalesce(model, 'unknown'), coalesce(status, 'pending');
+
+drop trigger if exists generated_images_rollup on public.generated_images;
+create trigger generated_images_rollup
+    after insert or update of status, model on public.generated_images
+    for each row execute function public.generated_images_rollup();
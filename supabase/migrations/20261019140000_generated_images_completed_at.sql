@@ -0,0 +1,34 @@
+-- When each job completed, for the incremental export manifest
+-- (/dashboard/jobs/manifest). Set by a trigger so the n8n workflow, the
+-- completion callback and batch ingest all stamp it the same way.
+
+alter table public.generated_images add column if not exists completed_at timestamptz;
+
+-- Existing completed jobs: the creation time is the best estimate there is.
+update public.generated_images
+    set completed_at = created_at
+    where status = 'completed' and completed_at is null;
+
+create or replace function public.generated_images_completed_at() returns trigger
+language plpgsql as $$
+begin
+    if new.status = 'completed' then
+        if tg_op = 'INSERT' or old.status is distinct from 'completed' then
+            new.completed_at := now();
+        else
+            new.completed_at := coalesce(new.completed_at, old.completed_at, now());
+        end if;
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists generated_images_completed_at on public.generated_images;
+create trigger generated_images_completed_at
+    before insert or update of status on public.generated_images
+    for each row execute function public.generated_images_completed_at();
+
+-- Serves the manifest's keyset pages: one user's completed jobs by completion.
+create index if not exists generated_images_completed_idx
+    on public.generated_images (email, completed_at, id)
+    where status = 'completed';
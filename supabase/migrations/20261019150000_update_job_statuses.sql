@@ -0,0 +1,20 @@
+-- Batched job status writes for the completion callback (/jobs/events) and
+-- batch ingest (/jobs/ingest): one call updates many jobs. Each row only
+-- touches the job with that id *and* email, so an unknown id creates
+-- nothing and a job is never moved to another user. Absent fields keep
+-- their current value. Returns the ids that matched.
+
+create or replace function public.update_job_statuses(rows jsonb)
+returns table (id text) language sql as $$
+    update public.generated_images as g
+       set status  = coalesce(r.status, g.status),
+           message = coalesce(r.message, g.message),
+           url     = coalesce(r.url, g.url)
+      from jsonb_to_recordset(rows) as r(id text, email text, status text, message text, url text)
+     where g.id::text = r.id
+       and g.email = r.email
+    returning g.id::text;
+$$;
+
+-- Only the service role (the app) calls it.
+revoke execute on function public.update_job_statuses(jsonb) from public, anon, authenticated;
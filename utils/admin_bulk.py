@@ -0,0 +1,185 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from extensions import supabase_admin, logger
+from utils.metrics import inc
+from utils.tracing import parse_timestamp
+
+ADMIN_BULK_CONCURRENCY = int(os.getenv("ADMIN_BULK_CONCURRENCY", 8))
+ADMIN_BULK_MAX_USERS = int(os.getenv("ADMIN_BULK_MAX_USERS", 1000))
+LIST_USERS_PAGE_SIZE = 1000
+BULK_ACTIONS = ("set_credits", "add_credits", "disable", "enable", "verify", "delete")
+# Actions that lose state; they never run on an empty filter.
+DESTRUCTIVE_ACTIONS = ("set_credits", "disable", "delete")
+FILTER_KEYS = ("email", "disabled", "verified", "inactive_since", "max_credits")
+BOOLEAN_FILTERS = ("disabled", "verified")
+# The account behind the admin login is never a bulk target.
+ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
+
+
+class BulkError(ValueError):
+    pass
+
+
+def _confirmed_at(user):
+    return getattr(user, "email_confirmed_at", None) or getattr(user, "confirmed_at", None)
+
+
+def user_row(user):
+    """What the admin table shows for a user, as JSON."""
+    metadata = user.user_metadata or {}
+    last_sign_in = getattr(user, "last_sign_in_at", None)
+    return {
+        "id": user.id,
+        "email": user.email,
+        "credits": metadata.get("credits", 0),
+        "disabled": metadata.get("disabled") == "True",
+        "verified": bool(_confirmed_at(user)),
+        "last_sign_in_at": str(last_sign_in) if last_sign_in else None,
+    }
+
+
+def list_all_users():
+    """Every auth user, read in pages."""
+    users, page = [], 1
+    while True:
+        batch = supabase_admin.auth.admin.list_users(page=page, per_page=LIST_USERS_PAGE_SIZE) or []
+        users.extend(batch)
+        if len(batch) < LIST_USERS_PAGE_SIZE:
+            return users
+        page += 1
+
+
+def parse_bool(name, value):
+    """Filter flag from JSON or a query string; "false" is False."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes"):
+        return True
+    if text in ("false", "0", "no"):
+        return False
+    raise BulkError(f"{name} must be true or false")
+
+
+def is_protected(user, actor_id=None):
+    """True for the calling admin's own accounts."""
+    return user.id == actor_id or (ADMIN_EMAIL and (user.email or "").lower() == ADMIN_EMAIL.lower())
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return parse_timestamp(value)
+
+
+def matches(user, filters):
+    """True if a user matches every given filter."""
+    row = user_row(user)
+    email = (filters.get("email") or "").strip().lower()
+    if email and email not in (row["email"] or "").lower():
+        return False
+    for flag in BOOLEAN_FILTERS:
+        if filters.get(flag) is not None and row[flag] != filters[flag]:
+            return False
+    if filters.get("max_credits") is not None and int(row["credits"] or 0) > int(filters["max_credits"]):
+        return False
+    if filters.get("inactive_since"):
+        cutoff = parse_timestamp(filters["inactive_since"])
+        last = _as_datetime(getattr(user, "last_sign_in_at", None))
+        if last is not None and last.tzinfo is None:
+            last = last.replace(tzinfo=timezone.utc)
+        if last is not None and last >= cutoff:
+            return False
+    return True
+
+
+def select_user_ids(filters, actor_id=None):
+    """
+    Ids of the users matching a filter dict (keys in FILTER_KEYS), leaving
+    out the caller's own accounts.
+    """
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise BulkError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+    filters = {key: value for key, value in filters.items() if value not in (None, "")}
+    for flag in BOOLEAN_FILTERS:
+        if flag in filters:
+            filters[flag] = parse_bool(flag, filters[flag])
+    if filters.get("inactive_since") and parse_timestamp(filters["inactive_since"]) is None:
+        raise BulkError("inactive_since must be an ISO date")
+    if filters.get("max_credits") is not None:
+        try:
+            int(filters["max_credits"])
+        except (TypeError, ValueError):
+            raise BulkError("max_credits must be a number")
+    return [
+        user.id for user in list_all_users()
+        if matches(user, filters) and not is_protected(user, actor_id)
+    ]
+
+
+def _credits(params):
+    try:
+        return int(params.get("credits"))
+    except (TypeError, ValueError):
+        raise BulkError("Credits must be a number.")
+
+
+def apply_action(user_id, action, params):
+    """Run one admin action on one user; returns the user's new table row, or None once deleted."""
+    admin = supabase_admin.auth.admin
+    if action == "delete":
+        admin.delete_user(user_id)
+        return None
+    if action == "verify":
+        attributes = {"email_confirm": True}
+    elif action in ("disable", "enable"):
+        attributes = {"user_metadata": {"disabled": "True" if action == "disable" else "False"}}
+    elif action == "set_credits":
+        attributes = {"user_metadata": {"credits": _credits(params)}}
+    else:  # add_credits
+        current = (admin.get_user_by_id(user_id).user.user_metadata or {}).get("credits") or 0
+        attributes = {"user_metadata": {"credits": max(int(current) + _credits(params), 0)}}
+    return user_row(admin.update_user_by_id(user_id, attributes).user)
+
+
+def run_bulk(action, user_ids, params=None, actor_id=None):
+    """
+    Apply an action to many users, ADMIN_BULK_CONCURRENCY Admin API calls
+    at a time. Returns one result per user, in the order given. The
+    caller's own accounts (actor_id, ADMIN_EMAIL) are refused.
+    """
+    params = params or {}
+    if action not in BULK_ACTIONS:
+        raise BulkError(f"Unknown action '{action}'")
+    if action in ("set_credits", "add_credits"):
+        _credits(params)
+    user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids if user_id))
+    if not user_ids:
+        raise BulkError("No users selected")
+    if len(user_ids) > ADMIN_BULK_MAX_USERS:
+        raise BulkError(f"At most {ADMIN_BULK_MAX_USERS} users per request")
+
+    def run(user_id):
+        try:
+            if user_id == actor_id:
+                raise BulkError("Bulk actions cannot target your own account")
+            if action in DESTRUCTIVE_ACTIONS and ADMIN_EMAIL:
+                target = supabase_admin.auth.admin.get_user_by_id(user_id).user
+                if is_protected(target, actor_id):
+                    raise BulkError("Bulk actions cannot target your own account")
+            return {"user_id": user_id, "success": True, "user": apply_action(user_id, action, params)}
+        except Exception as e:
+            logger.error(f"❌ Bulk {action} failed for {user_id}: {e}")
+            return {"user_id": user_id, "success": False, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(ADMIN_BULK_CONCURRENCY, len(user_ids)))) as pool:
+        results = list(pool.map(run, user_ids))
+
+    ok = sum(1 for result in results if result["success"])
+    inc("admin_bulk_users_total", amount=ok, action=action, result="success")
+    inc("admin_bulk_users_total", amount=len(results) - ok, action=action, result="error")
+    logger.info(f"🛠️ Admin bulk {action}: {ok}/{len(results)} user(s) updated")
+    return results
@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+
+from extensions import cache, supabase_admin
+
+ROLLUP_PAGE_SIZE = 1000
+FAILED_STATUSES = ("failed", "error")
+ANALYTICS_CACHE_TTL = 60
+
+
+def load_rollups(since: date):
+    """usage_rollups rows from `since` on, read in pages."""
+    rows, start = [], 0
+    while True:
+        page = (
+            supabase_admin.table("usage_rollups")
+            .select("day, email, model, status, jobs, credits")
+            .gte("day", since.isoformat())
+            .order("day")
+            .order("email")
+            .order("model")
+            .order("status")
+            .range(start, start + ROLLUP_PAGE_SIZE - 1)
+            .execute()
+            .data
+            or []
+        )
+        rows.extend(page)
+        if len(page) < ROLLUP_PAGE_SIZE:
+            return rows
+        start += ROLLUP_PAGE_SIZE
+
+
+def _bucket(groups, key):
+    return groups.setdefault(key, {"jobs": 0, "completed": 0, "failed": 0, "pending": 0, "credits": 0})
+
+
+def summarize(rows):
+    """Fold rollup rows into per-day, per-user and per-model tables."""
+    by_day, by_user, by_model = {}, {}, {}
+    totals = {"jobs": 0, "completed": 0, "failed": 0, "pending": 0, "credits": 0}
+    for row in rows:
+        status = "failed" if row["status"] in FAILED_STATUSES else row["status"]
+        for entry in (_bucket(by_day, row["day"]), _bucket(by_user, row["email"]),
+                      _bucket(by_model, row["model"]), totals):
+            entry["jobs"] += row["jobs"]
+            entry["credits"] += row["credits"]
+            if status in entry:
+                entry[status] += row["jobs"]
+
+    for entry in list(by_model.values()) + [totals]:
+        finished = entry["completed"] + entry["failed"]
+        entry["failure_rate"] = entry["failed"] / finished if finished else 0.0
+
+    return {
+        "totals": totals,
+        "by_day": sorted(by_day.items(), reverse=True),
+        "by_user": sorted(by_user.items(), key=lambda item: item[1]["credits"], reverse=True),
+        "by_model": sorted(by_model.items(), key=lambda item: item[1]["jobs"], reverse=True),
+    }
+
+
+def usage_summary(days: int):
+    """Summary of the last `days` days, cached briefly."""
+    key = f"usage_summary:{days}"
+    summary = cache.get(key)
+    if summary is None:
+        since = date.today() - timedelta(days=days - 1)
+        summary = summarize(load_rollups(since))
+        summary["since"] = since.isoformat()
+        cache.set(key, summary, timeout=ANALYTICS_CACHE_TTL)
+    return summary
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_file, url_for, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Optional — only .gz variants are written without it
+    brotli = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+FINGERPRINT_EXTENSIONS = {".js", ".css", ".svg"}
+COMPRESS_EXTENSIONS = {".js", ".css", ".svg"}
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+_manifest = None
+
+
+def build_assets():
+    """
+    Write content-hashed copies of the static assets into static/dist, with
+    precompressed .gz (and .br when brotli is installed) variants, plus a
+    manifest mapping each logical path to its hashed path.
+    """
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    manifest = {}
+    for folder, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(folder, d) != DIST_DIR]
+        for name in files:
+            base, ext = os.path.splitext(name)
+            if ext not in FINGERPRINT_EXTENSIONS:
+                continue
+            source = os.path.join(folder, name)
+            logical = os.path.relpath(source, STATIC_DIR).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = os.path.join(os.path.dirname(logical), f"{base}.{digest}{ext}").replace(os.sep, "/")
+            target = os.path.join(DIST_DIR, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+
+            if ext in COMPRESS_EXTENSIONS:
+                gz = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(gz) < len(data):
+                    with open(target + ".gz", "wb") as f:
+                        f.write(gz)
+                if brotli is not None:
+                    br = brotli.compress(data, quality=11)
+                    if len(br) < len(data):
+                        with open(target + ".br", "wb") as f:
+                            f.write(br)
+
+            manifest[logical] = hashed
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(path: str) -> str:
+    """
+    Template helper: URL of the fingerprinted asset when the pipeline has
+    been built, otherwise the plain static URL.
+    """
+    hashed = load_manifest().get(path)
+    if hashed:
+        return url_for("assets", filename=hashed)
+    return url_for("static", filename=path)
+
+
+def serve_asset(filename):
+    """Serve a fingerprinted asset in the best encoding the client accepts."""
+    if filename not in set(load_manifest().values()):
+        abort(404)
+    path = safe_join(DIST_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=31536000)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE
+    return response
+
+
+def init_assets(app):
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.jinja_env.globals["asset_url"] = asset_url
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Fingerprint and precompress everything under static/."""
+        manifest = build_assets()
+        print(f"Built {len(manifest)} asset(s) into {DIST_DIR}")
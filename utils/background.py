@@ -0,0 +1,252 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from extensions import cache, logger
+from utils.metrics import inc, observe
+
+# FALSE runs every task inline, before the response (tests, serverless).
+# Serverless functions are frozen once the response is sent, so threads
+# would never finish their work there: inline is the default on Vercel.
+BACKGROUND_TASKS = os.getenv("BACKGROUND_TASKS", "FALSE" if os.getenv("VERCEL") else "TRUE").upper() == "TRUE"
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 4))
+BACKGROUND_QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", 1000))
+BACKGROUND_RETRIES = int(os.getenv("BACKGROUND_RETRIES", 3))
+BACKGROUND_RETRY_DELAY = float(os.getenv("BACKGROUND_RETRY_DELAY", 2.0))
+# How long shutdown waits for queued tasks before giving up on them.
+BACKGROUND_DRAIN_SECONDS = float(os.getenv("BACKGROUND_DRAIN_SECONDS", 10))
+# Keep tasks in Redis until they finish, so a restart picks them up again.
+BACKGROUND_DURABLE = os.getenv("BACKGROUND_DURABLE", "FALSE").upper() == "TRUE"
+DURABLE_KEY = "bg:tasks"
+LEASE_SECONDS = 60
+
+_registry = {}
+
+
+def background_task(fn):
+    """Register a function so it can be submitted (and replayed by name)."""
+    fn.task_name = f"{fn.__module__}.{fn.__qualname__}"
+    _registry[fn.task_name] = fn
+    return fn
+
+
+class TaskExecutor:
+    """
+    Runs registered functions on a small pool of worker threads after the
+    response has gone out. The queue is bounded: when it is full the task
+    runs inline in the caller, so load slows requests down instead of
+    dropping work. Failed tasks are retried with exponential backoff.
+
+    With BACKGROUND_DURABLE (and a Redis cache) each task is also written
+    to a Redis hash until it finishes. Workers hold a short lease on the
+    tasks they own; tasks whose lease lapses, because their process died,
+    are claimed and rerun by another process. Delivery is at least once,
+    so tasks must be safe to repeat.
+    """
+
+    def __init__(self, workers=BACKGROUND_WORKERS, queue_size=BACKGROUND_QUEUE_SIZE,
+                 retries=BACKGROUND_RETRIES, retry_delay=BACKGROUND_RETRY_DELAY, durable=BACKGROUND_DURABLE):
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.durable = durable
+        self.owner = uuid.uuid4().hex
+        self.app = None
+        self.redis = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._timers = {}  # {task id: Timer} for scheduled retries
+        self._owned = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def init_app(self, app):
+        self.app = app
+        with app.app_context():
+            self.redis = getattr(cache.cache, "_write_client", None)
+        if self.durable and self.redis is None:
+            logger.warning("⚠️ BACKGROUND_DURABLE needs a Redis cache; tasks are kept in memory only")
+            self.durable = False
+        if BACKGROUND_TASKS and self.workers > 0 and not self._threads:
+            self._start()
+            atexit.register(self.drain)
+        if self.durable:
+            self.recover()
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"background-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.durable:
+            threading.Thread(target=self._heartbeat, name="background-lease", daemon=True).start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); fn must be a @background_task."""
+        name = getattr(fn, "task_name", None)
+        if name not in _registry:
+            raise ValueError(f"{fn!r} is not a registered background task")
+        task = {"id": uuid.uuid4().hex, "name": name, "args": list(args), "kwargs": kwargs,
+                "attempt": 0, "queued_at": time.time()}
+
+        if not BACKGROUND_TASKS or not self._threads or self._closed:
+            self._run(task, inline=True)
+            return task["id"]
+        if self.durable:
+            self._persist(task)
+        self._enqueue(task)
+        return task["id"]
+
+    def _enqueue(self, task):
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            inc("background_tasks_total", task=task["name"], result="inline")
+            self._run(task, inline=True)
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            try:
+                self._run(task)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, task, inline=False):
+        fn = _registry[task["name"]]
+        observe("background_task_wait_seconds", time.time() - task["queued_at"], task=task["name"])
+        try:
+            with self.app.app_context():
+                fn(*task["args"], **task["kwargs"])
+        except Exception as e:
+            task["attempt"] += 1
+            if self._closed and self.durable:
+                logger.warning(f"⚠️ Background task {task['name']} failed during shutdown ({e}); left for recovery")
+                return
+            if task["attempt"] <= self.retries and self._threads and not self._closed:
+                delay = self.retry_delay * 2 ** (task["attempt"] - 1)
+                logger.warning(f"⚠️ Background task {task['name']} failed ({e}); retry {task['attempt']} in {delay:.0f}s")
+                self._schedule_retry(task, delay)
+                return
+            logger.error(f"❌ Background task {task['name']} failed after {task['attempt']} attempt(s): {e}")
+            inc("background_tasks_total", task=task["name"], result="failed")
+        else:
+            if not inline:
+                inc("background_tasks_total", task=task["name"], result="success")
+        self._forget(task)
+
+    def _schedule_retry(self, task, delay):
+        def retry():
+            with self._lock:
+                self._timers.pop(task["id"], None)
+            self._enqueue(task)
+
+        timer = threading.Timer(delay, retry)
+        timer.daemon = True
+        with self._lock:
+            self._timers[task["id"]] = timer
+        timer.start()
+
+    def drain(self, timeout=BACKGROUND_DRAIN_SECONDS):
+        """
+        Stop taking new background work and finish what is queued, within
+        `timeout` seconds. Pending retries get one last attempt. Returns
+        the number of tasks left unfinished (kept in Redis when durable).
+        """
+        self._closed = True
+        with self._lock:
+            timers, self._timers = list(self._timers.items()), {}
+        for _, timer in timers:
+            timer.cancel()
+            timer.function()
+
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        left = self._queue.unfinished_tasks
+        if left:
+            logger.warning(f"⚠️ Shutting down with {left} background task(s) unfinished")
+        return left
+
+    # --- Durable mode ---
+
+    def _persist(self, task):
+        client = self.redis
+        client.hset(DURABLE_KEY, task["id"], json.dumps(task))
+        client.set(f"{DURABLE_KEY}:lease:{task['id']}", self.owner, ex=LEASE_SECONDS)
+        with self._lock:
+            self._owned.add(task["id"])
+
+    def _forget(self, task):
+        if not self.durable:
+            return
+        with self._lock:
+            self._owned.discard(task["id"])
+        try:
+            client = self.redis
+            client.hdel(DURABLE_KEY, task["id"])
+            client.delete(f"{DURABLE_KEY}:lease:{task['id']}")
+        except Exception as e:
+            logger.error(f"❌ Failed to clear finished background task {task['id']}: {e}")
+
+    def recover(self):
+        """Claim and queue stored tasks whose owner has stopped renewing them."""
+        client = self.redis
+        recovered = 0
+        for task_id, raw in (client.hgetall(DURABLE_KEY) or {}).items():
+            task_id = task_id.decode() if isinstance(task_id, bytes) else task_id
+            if not client.set(f"{DURABLE_KEY}:lease:{task_id}", self.owner, ex=LEASE_SECONDS, nx=True):
+                continue
+            if not client.hexists(DURABLE_KEY, task_id):
+                # Finished between the listing and the claim.
+                client.delete(f"{DURABLE_KEY}:lease:{task_id}")
+                continue
+            task = json.loads(raw)
+            if task["name"] not in _registry:
+                logger.error(f"❌ Dropping stored background task with unknown name {task['name']}")
+                client.hdel(DURABLE_KEY, task_id)
+                continue
+            with self._lock:
+                self._owned.add(task_id)
+            if self._threads:
+                self._enqueue(task)
+            else:
+                self._run(task, inline=True)
+            recovered += 1
+        if recovered:
+            logger.info(f"♻️ Recovered {recovered} stored background task(s)")
+        return recovered
+
+    def _heartbeat(self):
+        while not self._closed:
+            time.sleep(LEASE_SECONDS / 3)
+            try:
+                with self._lock:
+                    owned = list(self._owned)
+                client = self.redis
+                for task_id in owned:
+                    client.set(f"{DURABLE_KEY}:lease:{task_id}", self.owner, ex=LEASE_SECONDS)
+                self.recover()
+            except Exception as e:
+                logger.error(f"❌ Background task lease renewal failed: {e}")
+
+
+executor = TaskExecutor()
+
+
+def defer(fn, *args, **kwargs):
+    """Run a @background_task after the response; see TaskExecutor."""
+    return executor.submit(fn, *args, **kwargs)
+
+
+def runs_in_background():
+    """True when defer() hands work to the workers instead of running it inline."""
+    return BACKGROUND_TASKS and bool(executor._threads) and not executor._closed
+
+
+def init_background(app):
+    executor.init_app(app)
@@ -0,0 +1,394 @@
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from extensions import cache, supabase_admin, logger, upload_to_gcs, MAX_UPLOAD_BYTES
+from utils.background import background_task, defer, runs_in_background
+from utils.image_variants import Image, create_variants
+from utils.reference_images import prewarm_reference
+from utils.metrics import track, inc
+
+BASKET_IMPORT_CONCURRENCY = int(os.getenv("BASKET_IMPORT_CONCURRENCY", 8))
+BASKET_IMPORT_MAX_ITEMS = int(os.getenv("BASKET_IMPORT_MAX_ITEMS", 500))
+# Without background workers (the Vercel default) an import runs inside its
+# request, so it has to fit in the function timeout.
+BASKET_IMPORT_INLINE_MAX_ITEMS = int(os.getenv("BASKET_IMPORT_INLINE_MAX_ITEMS", 25))
+BASKET_IMPORT_MAX_ARCHIVE_BYTES = int(os.getenv("BASKET_IMPORT_MAX_ARCHIVE_BYTES", 500 * 1024 * 1024))
+# Rows are written in groups so a long import shows up in the basket as it goes.
+INSERT_BATCH_SIZE = 50
+IMPORT_QUALITY = 92
+FETCH_TIMEOUT = 30
+PROGRESS_TTL = 24 * 60 * 60
+MAX_REPORTED_ERRORS = 50
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff")
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+class BasketImportError(ValueError):
+    pass
+
+
+def _progress_key(email, import_id):
+    return f"basket_import:{email}:{import_id}"
+
+
+def import_progress(email, import_id):
+    """Progress dict of one of the user's imports, or None."""
+    return cache.get(_progress_key(email, import_id))
+
+
+def check_url(url):
+    """
+    Only fetch public http(s) URLs; anything resolving to a private,
+    loopback or link-local address is refused. Returns the address to
+    connect to.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("Only http(s) URLs can be imported")
+    try:
+        addresses = sorted({info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or 443)})
+    except socket.gaierror:
+        raise ValueError("Host not found")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global:
+            raise ValueError("URL points to a private address")
+    return addresses[0]
+
+
+class _PinnedHostAdapter(HTTPAdapter):
+    """Verifies TLS (SNI and certificate) against a hostname while connecting to an IP."""
+
+    def __init__(self, hostname, **kwargs):
+        self.hostname = hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["server_hostname"] = self.hostname
+        kwargs["assert_hostname"] = self.hostname
+        super().init_poolmanager(*args, **kwargs)
+
+
+def safe_get(url, **kwargs):
+    """
+    GET a caller-supplied URL without redirects, connecting to the address
+    check_url vetted rather than resolving the name again, so a DNS answer
+    that changes in between cannot point the request at a private host.
+    """
+    address = check_url(url)
+    parsed = urlparse(url)
+    host = f"[{parsed.hostname}]" if ":" in parsed.hostname else parsed.hostname
+    if parsed.port:
+        host = f"{host}:{parsed.port}"
+    pinned = f"[{address}]" if ":" in address else address
+    if parsed.port:
+        pinned = f"{pinned}:{parsed.port}"
+
+    session = requests.Session()
+    session.trust_env = False  # A proxy would resolve the name itself.
+    if parsed.scheme == "https":
+        session.mount("https://", _PinnedHostAdapter(parsed.hostname))
+    headers = {**kwargs.pop("headers", {}), "Host": host}
+    return session.get(parsed._replace(netloc=pinned).geturl(), headers=headers, allow_redirects=False, **kwargs)
+
+
+def fetch_image(url):
+    with track("import", "fetch"):
+        with safe_get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+            if response.status_code != 200:
+                raise ValueError(f"Fetch failed: {response.status_code}")
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > MAX_UPLOAD_BYTES:
+                    raise ValueError("Image too large")
+    return bytes(data)
+
+
+def normalize_image(data: bytes) -> bytes:
+    """
+    Validate the bytes as an image and re-encode them as JPEG. Without
+    Pillow only JPEGs are accepted, and stored unchanged.
+    """
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError("Image too large")
+    if Image is None:
+        if not data.startswith(JPEG_MAGIC):
+            raise ValueError("Not a JPEG image")
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format == "JPEG" and img.mode == "RGB":
+                return data
+            img.seek(0)  # First frame of animations
+            if img.mode in ("RGBA", "LA", "P"):
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.split()[-1])
+            else:
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=IMPORT_QUALITY, optimize=True)
+            return out.getvalue()
+    except Image.DecompressionBombError:
+        raise ValueError("Image dimensions too large")
+    except (OSError, SyntaxError):
+        raise ValueError("Not a valid image")
+
+
+def store_image(email, data):
+    """Upload a normalized image; returns its new my_images id."""
+    image_id = str(uuid.uuid4())
+    with track("import", "normalize"):
+        jpeg = normalize_image(data)
+    upload_to_gcs(io.BytesIO(jpeg), f"storage/{email}/my_images", f"{image_id}.jpeg")
+    create_variants(f"storage/{email}/my_images/{image_id}.jpeg", jpeg)
+    prewarm_reference(email, image_id, jpeg)
+    return image_id
+
+
+def url_sources(urls):
+    """(name, load) pairs; each load fetches its image in a worker."""
+    for url in urls:
+        yield url, (lambda url=url: fetch_image(url))
+
+
+def _is_image_entry(info):
+    name = info.filename
+    base = os.path.basename(name)
+    return (
+        not info.is_dir()
+        and base
+        and not base.startswith(".")
+        and not name.startswith("__MACOSX/")
+        and base.lower().endswith(IMAGE_SUFFIXES)
+    )
+
+
+def archive_sources(archive):
+    """
+    (name, load) pairs for the images in a ZIP. Entries are read one at a
+    time in the coordinating thread, since a ZipFile is not safe to read
+    from several threads; decoding and uploads run in the workers.
+    """
+    for info in archive.infolist():
+        if not _is_image_entry(info):
+            continue
+        if info.file_size > MAX_UPLOAD_BYTES:
+            yield info.filename, None
+            continue
+        data = archive.read(info)
+        yield info.filename, (lambda data=data: data)
+
+
+class BasketImport:
+    """
+    One bulk import into a user's basket. Sources are pulled lazily and at
+    most `concurrency` images are in flight, so memory stays bounded by the
+    pool rather than by the size of the import. Progress is kept in the
+    shared cache under the import id.
+    """
+
+    def __init__(self, email, total, source_kind, import_id=None, concurrency=BASKET_IMPORT_CONCURRENCY):
+        self.app = current_app._get_current_object()
+        self.email = email
+        self.id = import_id or str(uuid.uuid4())
+        self.concurrency = max(1, concurrency)
+        self.progress = {
+            "id": self.id,
+            "source": source_kind,
+            "status": "running",
+            "total": total,
+            "processed": 0,
+            "imported": 0,
+            "failed": 0,
+            "errors": [],
+            "ids": [],
+            "started_at": time.time(),
+        }
+        self._rows = []
+        self._save()
+
+    def _save(self):
+        cache.set(_progress_key(self.email, self.id), self.progress, timeout=PROGRESS_TTL)
+
+    def _fail(self, name, error):
+        self.progress["failed"] += 1
+        if len(self.progress["errors"]) < MAX_REPORTED_ERRORS:
+            self.progress["errors"].append({"source": name, "error": str(error)})
+
+    def _flush_rows(self):
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        try:
+            supabase_admin.table("my_images").upsert(rows).execute()
+            self.progress["imported"] += len(rows)
+            self.progress["ids"].extend(row["id"] for row in rows)
+        except Exception as e:
+            logger.error(f"❌ Failed to record {len(rows)} imported image(s): {e}")
+            for row in rows:
+                self._fail(row["id"], "Stored, but not added to the basket")
+
+    def _work(self, name, load):
+        if load is None:
+            raise ValueError("Image too large")
+        # Workers need an app context for the shared cache.
+        with self.app.app_context():
+            return store_image(self.email, load())
+
+    def run(self, sources):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            in_flight = {}
+            for name, load in sources:
+                if len(in_flight) >= self.concurrency:
+                    self._collect(in_flight, wait(in_flight, return_when=FIRST_COMPLETED).done)
+                in_flight[pool.submit(self._work, name, load)] = name
+            self._collect(in_flight, wait(in_flight).done)
+        self._flush_rows()
+
+        self.progress["status"] = "completed"
+        self.progress["seconds"] = round(time.time() - self.progress.pop("started_at"), 2)
+        self._save()
+        inc("basket_import_images_total", amount=self.progress["imported"], result="success")
+        inc("basket_import_images_total", amount=self.progress["failed"], result="error")
+        logger.info(
+            f"📥 Basket import {self.id} for {self.email}: "
+            f"{self.progress['imported']} imported, {self.progress['failed']} failed"
+        )
+        return self.progress
+
+    def _collect(self, in_flight, done):
+        for future in done:
+            name = in_flight.pop(future)
+            try:
+                self._rows.append({"email": self.email, "id": future.result()})
+            except Exception as e:
+                self._fail(name, e)
+            self.progress["processed"] += 1
+        if len(self._rows) >= INSERT_BATCH_SIZE:
+            self._flush_rows()
+        self._save()
+
+    def abort(self, error):
+        self._flush_rows()
+        self.progress["status"] = "failed"
+        self.progress["error"] = str(error)
+        self.progress.pop("started_at", None)
+        self._save()
+
+
+def _run(job, sources, cleanup=None):
+    # Failures end the import rather than raising: a retry would import
+    # the images that did succeed a second time.
+    try:
+        job.run(sources)
+    except Exception as e:
+        logger.error(f"❌ Basket import {job.id} failed: {e}")
+        job.abort(e)
+    finally:
+        if cleanup:
+            cleanup()
+
+
+@background_task
+def run_url_import(email, import_id, urls):
+    _run(BasketImport(email, len(urls), "urls", import_id), url_sources(urls))
+
+
+@background_task
+def run_archive_import(email, import_id, path, total):
+    job = BasketImport(email, total, "zip", import_id)
+    try:
+        archive = zipfile.ZipFile(path)
+    except (OSError, zipfile.BadZipFile):
+        # The spool only lives on the instance that took the upload.
+        job.abort("The uploaded archive is no longer available; upload it again")
+        return
+
+    def cleanup():
+        archive.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    _run(job, archive_sources(archive), cleanup)
+
+
+def max_items():
+    """Largest import this process accepts: inline imports are capped."""
+    if runs_in_background():
+        return BASKET_IMPORT_MAX_ITEMS
+    return min(BASKET_IMPORT_MAX_ITEMS, BASKET_IMPORT_INLINE_MAX_ITEMS)
+
+
+def _check_total(total):
+    limit = max_items()
+    if total > limit:
+        raise BasketImportError(f"At most {limit} images per import")
+
+
+def _start(email, total, source_kind, task, *args):
+    """Record the import as running and hand it to the background executor."""
+    job = BasketImport(email, total, source_kind)
+    # Snapshot before a worker starts changing the stored progress.
+    progress = {**job.progress, "errors": [], "ids": []}
+    defer(task, email, job.id, *args)
+    # When tasks run inline the import has already finished.
+    return import_progress(email, job.id) or progress
+
+
+def start_url_import(email, urls):
+    """Validate the URL list and start importing it; returns the initial progress."""
+    if not isinstance(urls, list) or not urls:
+        raise BasketImportError("Provide a non-empty list of URLs")
+    urls = list(dict.fromkeys(str(url).strip() for url in urls if str(url).strip()))
+    _check_total(len(urls))
+    return _start(email, len(urls), "urls", run_url_import, urls)
+
+
+def start_archive_import(email, stream):
+    """
+    Spool an uploaded ZIP to a temporary file and start importing it.
+    The archive is opened from disk, so it is never held in memory whole.
+    """
+    spool = tempfile.NamedTemporaryFile(prefix="basket-import-", suffix=".zip", delete=False)
+    try:
+        size = 0
+        with spool:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > BASKET_IMPORT_MAX_ARCHIVE_BYTES:
+                    raise BasketImportError("Archive too large")
+                spool.write(chunk)
+
+        try:
+            with zipfile.ZipFile(spool.name) as archive:
+                total = sum(1 for info in archive.infolist() if _is_image_entry(info))
+        except zipfile.BadZipFile:
+            raise BasketImportError("Not a ZIP archive")
+        if total == 0:
+            raise BasketImportError("No images found in the archive")
+        _check_total(total)
+    except BaseException:
+        os.remove(spool.name)
+        raise
+
+    return _start(email, total, "zip", run_archive_import, spool.name, total)
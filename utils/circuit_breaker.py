@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """
+    In-process circuit breaker for an outbound dependency.
+
+    Tracks the error rate and latency of recent calls. When the error rate
+    crosses the threshold the circuit opens and callers fail fast; after the
+    cooldown a single probe is let through (half-open) to decide whether to
+    close it again. Timeouts are derived from the observed latency.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 50,
+        min_calls: int = 10,
+        error_threshold: float = 0.5,
+        cooldown: float = 30.0,
+        min_timeout: float = 2.0,
+        max_timeout: float = 60.0,
+        timeout_multiplier: float = 3.0,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True for success
+        self._latencies = deque(maxlen=window * 4)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted right now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    self._rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                self._rejected += 1
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def release(self):
+        """
+        Hand back a slot from allow() that was not used for a call, so a
+        half-open circuit can still send its probe.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self._outcomes.append(True)
+            if self._state == self.HALF_OPEN:
+                self._close()
+
+    def record_failure(self, latency: float = None):
+        with self._lock:
+            if latency is not None:
+                self._latencies.append(latency)
+            self._outcomes.append(False)
+            if self._state == self.HALF_OPEN:
+                self._open()
+            elif self._state == self.CLOSED and self._should_open():
+                self._open()
+
+    def retry_after(self) -> int:
+        """Seconds until the next half-open probe is allowed."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            return max(int(remaining) + 1, 1)
+
+    def timeout(self) -> float:
+        """Request timeout derived from the observed p99 latency."""
+        p99 = self._percentile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return min(max(p99 * self.timeout_multiplier, self.min_timeout), self.max_timeout)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = calls - sum(self._outcomes)
+            state = self._state
+            rejected = self._rejected
+        return {
+            "name": self.name,
+            "state": state,
+            "calls": calls,
+            "error_rate": round(failures / calls, 3) if calls else 0.0,
+            "rejected": rejected,
+            "latency_p50": self._percentile(0.50),
+            "latency_p95": self._percentile(0.95),
+            "latency_p99": self._percentile(0.99),
+            "timeout": round(self.timeout(), 3),
+        }
+
+    def _percentile(self, q: float):
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_calls:
+            return None
+        index = min(int(q * len(samples)), len(samples) - 1)
+        return round(samples[index], 4)
+
+    def _should_open(self) -> bool:
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return False
+        failures = calls - sum(self._outcomes)
+        return failures / calls >= self.error_threshold
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def _close(self):
+        self._state = self.CLOSED
+        self._outcomes.clear()
+        self._probe_in_flight = False
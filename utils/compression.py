@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional — gzip is used without it
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_TYPES = {"text/html", "application/json", "text/plain"}
+
+
+def _is_dynamic_text(response):
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and response.mimetype in COMPRESSIBLE_TYPES
+        and "Content-Encoding" not in response.headers
+    )
+
+
+def conditional_and_compress(response):
+    """
+    after_request hook for HTML and JSON: add a weak ETag and answer
+    If-None-Match with 304, then compress bodies above COMPRESS_MIN_SIZE
+    with the best encoding the client accepts.
+    """
+    if not _is_dynamic_text(response):
+        return response
+
+    body = response.get_data()
+
+    if request.method in ("GET", "HEAD"):
+        response.set_etag(hashlib.sha1(body).hexdigest(), weak=True)
+        if "Cache-Control" not in response.headers:
+            # Let browsers keep the response but revalidate it every time.
+            response.headers["Cache-Control"] = "private, no-cache"
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    response.vary.add("Accept-Encoding")
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def init_compression(app):
+    app.after_request(conditional_and_compress)
@@ -0,0 +1,180 @@
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, url_for
+
+from extensions import bucket, cache, supabase_admin, logger, IMAGE_DELIVERY, generate_signed_url
+from utils.job_search import encode_cursor, decode_cursor, SearchError
+from utils.metrics import track, cache_result
+from utils.tracing import parse_timestamp
+
+MANIFEST_PAGE_SIZE = 200
+MAX_MANIFEST_PAGE_SIZE = 1000
+# Largest delta one archive request carries; clients continue from its cursor.
+EXPORT_MAX_ITEMS = int(os.getenv("EXPORT_MAX_ITEMS", 500))
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", 8))
+# Rows completed in the last few seconds may still be committing with an
+# earlier completed_at; leaving them for the next page keeps cursors exact.
+SETTLE_SECONDS = 5
+# Stored images never change, so their metadata can be kept for a long time.
+OBJECT_META_TTL = 7 * 24 * 60 * 60
+MANIFEST_COLUMNS = "id, prompt, model, created_at, completed_at"
+
+
+def _blob_path(email, job_id):
+    return f"storage/{email}/generated_images/{job_id}.jpeg"
+
+
+def object_meta(email, job_id):
+    """Size and checksums of a job's image, or None if it is missing."""
+    path = _blob_path(email, job_id)
+    key = f"objmeta:{path}"
+    meta = cache.get(key)
+    cache_result("object_meta", meta is not None)
+    if meta is not None:
+        return meta
+
+    with track("gcs", "get_blob"):
+        blob = bucket.get_blob(path)
+    if blob is None:
+        return None  # Not cached: the upload may still land.
+    meta = {
+        "size": blob.size,
+        "md5": blob.md5_hash,
+        "crc32c": getattr(blob, "crc32c", None),
+    }
+    cache.set(key, meta, timeout=OBJECT_META_TTL)
+    return meta
+
+
+def object_url(email, job_id):
+    """Where a sync client downloads the image from."""
+    if IMAGE_DELIVERY == "signed":
+        return generate_signed_url(_blob_path(email, job_id), download_name=f"{job_id}.jpeg")[0]
+    return url_for("dashboard.download_job", job_id=job_id, _external=True)
+
+
+def _completed_jobs(email, cursor, since, limit):
+    settled = datetime.now(timezone.utc) - timedelta(seconds=SETTLE_SECONDS)
+    query = (
+        supabase_admin.table("generated_images")
+        .select(MANIFEST_COLUMNS)
+        .eq("email", email)
+        .eq("status", "completed")
+        .lt("completed_at", settled.isoformat())
+    )
+    if cursor:
+        completed_at, job_id = decode_cursor(cursor)
+        query = query.or_(
+            f'completed_at.gt."{completed_at}",and(completed_at.eq."{completed_at}",id.gt.{job_id})'
+        )
+    elif since:
+        parsed = parse_timestamp(since)
+        if parsed is None:
+            raise SearchError("Invalid since timestamp, expected ISO 8601")
+        query = query.gt("completed_at", parsed.isoformat())
+
+    return (
+        query.order("completed_at")
+        .order("id")
+        .limit(limit + 1)
+        .execute()
+        .data
+        or []
+    )
+
+
+def manifest_page(email, cursor=None, since=None, limit=MANIFEST_PAGE_SIZE):
+    """
+    One page of a user's completed jobs in completion order, oldest first,
+    after `cursor` or else after the `since` timestamp (or from the start).
+
+    Each item carries its download URL, size and checksums (GCS md5/crc32c,
+    base64). Returns (items, next_cursor, has_more). next_cursor is always
+    the point to resume from, so a sync client stores it even when
+    has_more is false and passes it on its next run; it only changes once
+    new jobs have completed.
+    """
+    limit = max(1, min(int(limit), MAX_MANIFEST_PAGE_SIZE))
+    rows = _completed_jobs(email, cursor, since, limit)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1], "completed_at") if rows else cursor
+
+    app = current_app._get_current_object()
+
+    def meta(row):
+        # Workers need an app context for the shared cache.
+        with app.app_context():
+            return object_meta(email, row["id"])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(EXPORT_CONCURRENCY, len(rows)))) as pool:
+        metas = list(pool.map(meta, rows))
+
+    items = []
+    for row, object_info in zip(rows, metas):
+        if object_info is None:
+            logger.warning(f"⚠️ Completed job {row['id']} has no stored image; left out of the manifest")
+            continue
+        items.append({**row, **object_info, "filename": f"{row['id']}.jpeg", "url": object_url(email, row["id"])})
+    return items, next_cursor, has_more
+
+
+class _ZipStream:
+    """Write-only file for ZipFile that hands out what has been written so far."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_archive(email, items, manifest):
+    """
+    Yield a ZIP of the given manifest items as it is built, plus the
+    manifest itself as manifest.json. Images are fetched a window of
+    EXPORT_CONCURRENCY at a time and stored uncompressed (JPEGs do not
+    shrink), so memory stays bounded by the window rather than the export.
+    """
+    out = _ZipStream()
+
+    def fetch(item):
+        try:
+            with track("gcs", "fetch"):
+                return bucket.blob(_blob_path(email, item["id"])).download_as_bytes()
+        except Exception as e:
+            logger.error(f"❌ Export: failed to fetch {item['id']}: {e}")
+            return None
+
+    missing = []
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf, \
+            ThreadPoolExecutor(max_workers=max(1, EXPORT_CONCURRENCY)) as pool:
+        for start in range(0, len(items), EXPORT_CONCURRENCY):
+            window = items[start:start + EXPORT_CONCURRENCY]
+            for item, data in zip(window, pool.map(fetch, window)):
+                if data is None:
+                    missing.append(item["id"])
+                    continue
+                zf.writestr(item["filename"], data)
+                yield out.drain()
+        manifest = {**manifest, "missing": missing}
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2, default=str))
+    yield out.drain()
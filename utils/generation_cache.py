@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+
+from extensions import cache, bucket, logger
+from utils.metrics import track, cache_result
+
+# Entries expire after this many seconds without a hit (sliding expiry), and
+# SimpleCache drops the oldest entries beyond CACHE_THRESHOLD.
+GENERATION_CACHE_TTL = int(os.getenv("GENERATION_CACHE_TTL", 7 * 24 * 60 * 60))
+SCOPES = ("user", "global")
+
+_stats_lock = threading.Lock()
+generation_cache_stats = {scope: {"hits": 0, "misses": 0} for scope in SCOPES}
+
+
+def _normalize_prompt(prompt: str) -> str:
+    return " ".join((prompt or "").split()).lower()
+
+
+def generation_cache_key(scope, email, prompt, image_ids, width, height, model):
+    """
+    Hash the inputs that determine a generation's output.
+
+    The user scope identifies reference images by id. The global scope uses
+    the stored objects' MD5 so identical uploads from different users match.
+    """
+    if scope == "global":
+        images = []
+        for image_id in image_ids:
+            with track("gcs", "get_blob"):
+                blob = bucket.get_blob(f"storage/{email}/my_images/{image_id}.jpeg")
+            if blob is None:
+                return None
+            images.append(blob.md5_hash)
+        owner = None
+    else:
+        images = list(image_ids)
+        owner = email
+
+    normalized = {
+        "owner": owner,
+        "prompt": _normalize_prompt(prompt),
+        "images": sorted(images),
+        "width": int(width),
+        "height": int(height),
+        "model": model,
+    }
+    digest = hashlib.sha256(
+        json.dumps(normalized, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return f"generation:{scope}:{digest}"
+
+
+def lookup(key):
+    """Return the cached {email, job_ids} entry for a key, or None."""
+    entry = cache.get(key) if key else None
+    if entry:
+        # Refresh the expiry so frequently reused results stay cached.
+        cache.set(key, entry, timeout=GENERATION_CACHE_TTL)
+    return entry
+
+
+def record(scope, hit: bool):
+    with _stats_lock:
+        generation_cache_stats[scope]["hits" if hit else "misses"] += 1
+    cache_result(f"generation_{scope}", hit)
+
+
+def store(key, email, job_ids):
+    if not key:
+        return
+    cache.set(key, {"email": email, "job_ids": list(job_ids)}, timeout=GENERATION_CACHE_TTL)
+    logger.info(f"Cached generation result {key} ({len(job_ids)} job(s))")
+
+
+def forget(key):
+    if key:
+        cache.delete(key)
+
+
+def stats():
+    with _stats_lock:
+        snapshot = {scope: dict(counts) for scope, counts in generation_cache_stats.items()}
+    for counts in snapshot.values():
+        total = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = round(counts["hits"] / total, 3) if total else 0.0
+    return snapshot
@@ -0,0 +1,85 @@
+import os
+from functools import wraps
+
+from flask import request, session, jsonify, make_response
+
+from extensions import cache, logger
+from utils.metrics import cache_result
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 60 * 60))
+# How long a key stays locked while the first request is still running.
+IDEMPOTENCY_LOCK_TTL = 120
+IN_PROGRESS = "in_progress"
+# Client errors that retrying the same request cannot fix. Others (429 from
+# the rate limiter, 403 "no credits", 409 ...) can change, so they are not
+# stored.
+FINAL_CLIENT_ERRORS = (400, 422)
+
+
+def get_idempotency_key():
+    """
+    Read the client's idempotency key from the Idempotency-Key header or the
+    JSON body. Returns None when the client did not send one.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        data = request.get_json(silent=True) or {}
+        key = data.get("idempotency_key")
+    if not key:
+        return None
+    return str(key).strip()[:128] or None
+
+
+def idempotent(f):
+    """
+    Replay the stored outcome when a request is retried with the same
+    idempotency key, instead of running the view again.
+
+    Only 2xx outcomes and FINAL_CLIENT_ERRORS are stored; anything else
+    releases the key so the client can retry it.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = get_idempotency_key()
+        if not key:
+            return f(*args, **kwargs)
+
+        cache_key = f"idempotency:{session.get('user_id')}:{request.endpoint}:{key}"
+
+        first_attempt = cache.add(cache_key, IN_PROGRESS, timeout=IDEMPOTENCY_LOCK_TTL)
+        cache_result("idempotency", not first_attempt)
+        if not first_attempt:
+            stored = cache.get(cache_key)
+            if stored == IN_PROGRESS or stored is None:
+                return (
+                    jsonify({"error": "This request is already being processed."}),
+                    409,
+                )
+            response = make_response(stored["body"], stored["status"])
+            response.headers["Content-Type"] = stored["content_type"]
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if not (200 <= response.status_code < 300 or response.status_code in FINAL_CLIENT_ERRORS):
+            cache.delete(cache_key)
+        else:
+            cache.set(
+                cache_key,
+                {
+                    "status": response.status_code,
+                    "body": response.get_data(),
+                    "content_type": response.headers.get("Content-Type"),
+                },
+                timeout=IDEMPOTENCY_TTL,
+            )
+            logger.info(f"Stored outcome for idempotency key {key}")
+        return response
+
+    return decorated_function
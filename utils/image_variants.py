@@ -0,0 +1,274 @@
+import io
+import itertools
+import os
+import re
+
+import click
+from flask import request
+from google.api_core.exceptions import NotFound
+
+from extensions import bucket, cache, logger, upload_to_gcs
+from utils.background import background_task, defer, runs_in_background
+from utils.metrics import track, inc, cache_result
+
+try:
+    from PIL import Image
+except ImportError:  # Optional — originals are served as-is without it
+    Image = None
+
+IMAGE_VARIANTS = os.getenv("IMAGE_VARIANTS", "TRUE").upper() == "TRUE"
+# Best first; formats Pillow cannot write are skipped.
+VARIANT_FORMATS = [("avif", "image/avif"), ("webp", "image/webp")]
+VARIANT_QUALITY = {"avif": 55, "webp": 80}
+# Only images the app stores itself get variants.
+VARIANT_SOURCE = re.compile(r"^storage/[^/]+/(generated_images|my_images)/[^/.]+\.jpeg$")
+STORAGE_LINK = os.getenv("STORAGE_LINK", "https://storage.googleapis.com/secret-api/storage")
+# Variants are never rewritten, so "this one exists" can be kept for long.
+VARIANT_MARKER_TTL = 30 * 24 * 60 * 60
+# How long a queued (or failed) background build blocks another one, and
+# how long a variant found missing is served as the original without asking
+# the bucket again.
+VARIANT_RETRY_SECONDS = 10 * 60
+
+_supported = None
+
+
+def supported_formats():
+    """[(ext, mimetype)] this process can encode, best first."""
+    global _supported
+    if _supported is None:
+        if Image is None or not IMAGE_VARIANTS:
+            _supported = []
+        else:
+            Image.init()
+            _supported = [(ext, mime) for ext, mime in VARIANT_FORMATS if ext.upper() in Image.SAVE]
+    return _supported
+
+
+def variant_path(blob_path: str, ext: str) -> str:
+    """storage/a/generated_images/x.jpeg -> storage/a/generated_images/x.webp"""
+    return f"{os.path.splitext(blob_path)[0]}.{ext}"
+
+
+def image_src(path: str) -> str:
+    """Template helper: storage URL of e.g. "<email>/generated_images/<id>.jpeg"."""
+    return f"{STORAGE_LINK}/{path}"
+
+
+def variant_types():
+    """Template helper: mimetypes of the variants this deployment writes."""
+    return [mimetype for _, mimetype in supported_formats()]
+
+
+def image_sources(path: str):
+    """
+    Template helper: [{"type", "srcset"}] for a <picture>, covering the
+    variants of `path` already known to exist. Missing ones are left out
+    (a <source> that 404s has no fallback) and built in the background.
+    """
+    blob_path = f"storage/{path}"
+    formats = supported_formats()
+    if not formats or not VARIANT_SOURCE.match(blob_path):
+        return []
+    keys = [f"variant:{variant_path(blob_path, ext)}" for ext, _ in formats]
+    known = cache.get_many(*keys)
+    sources = [
+        {"type": mimetype, "srcset": image_src(variant_path(path, ext))}
+        for (ext, mimetype), exists in zip(formats, known)
+        if exists
+    ]
+    if len(sources) < len(formats):
+        schedule_variants(blob_path)
+    return sources
+
+
+def negotiate_formats():
+    """
+    [(ext, mimetype)] of the variants the client explicitly accepts, best
+    first; empty for the original. Wildcards do not count: */* clients get
+    the JPEG.
+    """
+    accepted = {mime for mime, quality in request.accept_mimetypes if quality > 0}
+    return [(ext, mimetype) for ext, mimetype in supported_formats() if mimetype in accepted]
+
+
+def encode_variant(data: bytes, ext: str) -> bytes:
+    with Image.open(io.BytesIO(data)) as img:
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format=ext.upper(), quality=VARIANT_QUALITY[ext])
+    return out.getvalue()
+
+
+def _mark_variant(path):
+    cache.set(f"variant:{path}", True, timeout=VARIANT_MARKER_TTL)
+
+
+def _store_variant(blob_path, ext, mimetype, data):
+    path = variant_path(blob_path, ext)
+    folder, filename = path.rsplit("/", 1)
+    upload_to_gcs(io.BytesIO(data), folder, filename, content_type=mimetype)
+    _mark_variant(path)
+
+
+def create_variants(blob_path: str, data: bytes, trigger: str = "ingest"):
+    """
+    Encode and store every supported variant of a freshly ingested image.
+    Best effort: a failure leaves the gallery on the JPEG until the
+    variant is rebuilt in the background.
+    """
+    if not VARIANT_SOURCE.match(blob_path):
+        return
+    for ext, mimetype in supported_formats():
+        try:
+            with track("images", f"encode_{ext}"):
+                encoded = encode_variant(data, ext)
+            _store_variant(blob_path, ext, mimetype, encoded)
+            inc("image_variants_created_total", format=ext, trigger=trigger)
+        except Exception as e:
+            logger.error(f"❌ Failed to create {ext} variant of {blob_path}: {e}")
+
+
+@background_task
+def build_variants(blob_path: str):
+    """Create whichever variants of a stored original are missing."""
+    missing = []
+    for ext, mimetype in supported_formats():
+        path = variant_path(blob_path, ext)
+        with track("gcs", "get_blob"):
+            exists = bucket.get_blob(path) is not None
+        if exists:
+            _mark_variant(path)
+        else:
+            missing.append((ext, mimetype))
+    if not missing:
+        return
+    try:
+        with track("gcs", "fetch"):
+            original = bucket.blob(blob_path).download_as_bytes()
+    except NotFound:
+        return
+    for ext, mimetype in missing:
+        try:
+            with track("images", f"encode_{ext}"):
+                encoded = encode_variant(original, ext)
+        except (OSError, ValueError) as e:
+            # Not a decodable image; retrying will not change that.
+            logger.warning(f"⚠️ Cannot build variants of {blob_path}: {e}")
+            return
+        _store_variant(blob_path, ext, mimetype, encoded)
+        inc("image_variants_created_total", format=ext, trigger="background")
+
+
+def schedule_variants(blob_path: str):
+    """
+    Queue build_variants for an original, at most once per
+    VARIANT_RETRY_SECONDS. Only when tasks really run after the response:
+    inline, it would put the encode back on the page view.
+    """
+    if not runs_in_background():
+        return
+    if cache.add(f"variant_pending:{blob_path}", True, timeout=VARIANT_RETRY_SECONDS):
+        defer(build_variants, blob_path)
+
+
+def variant_exists(blob_path: str, ext: str) -> bool:
+    """
+    Whether a variant has been written; never builds one. A miss is
+    remembered for VARIANT_RETRY_SECONDS (or until the variant is stored),
+    so uncached views do not each ask the bucket.
+    """
+    path = variant_path(blob_path, ext)
+    known = cache.get(f"variant:{path}")
+    cache_result("image_variant", known is not None)
+    if known is not None:
+        return known
+    with track("gcs", "get_blob"):
+        exists = bucket.get_blob(path) is not None
+    if exists:
+        _mark_variant(path)
+    else:
+        cache.set(f"variant:{path}", False, timeout=VARIANT_RETRY_SECONDS)
+        schedule_variants(blob_path)
+    return exists
+
+
+def load_variant(blob_path: str, ext: str) -> bytes:
+    """Bytes of an existing variant."""
+    with track("gcs", "fetch_variant"):
+        return bucket.blob(variant_path(blob_path, ext)).download_as_bytes()
+
+
+def _stem(name):
+    folder, _, filename = name.rpartition("/")
+    return f"{folder}/{filename.split('.', 1)[0]}"
+
+
+def build_missing_variants(prefix="storage/", limit=None):
+    """
+    Build the variants of every stored original that lacks some, found by
+    streaming the bucket listing: an original and its variants share a stem
+    and so arrive together. Covers images the app never sees land (written
+    by the generation workflow) and deployments where background tasks run
+    inline, which never queue builds from page views. Returns a report.
+    """
+    formats = supported_formats()
+    report = {"originals": 0, "built": 0, "errors": 0}
+    if not formats:
+        return report
+    with track("gcs", "list"):
+        blobs = bucket.list_blobs(prefix=prefix, page_size=1000)
+    for stem, group in itertools.groupby(blobs, key=lambda b: _stem(b.name)):
+        names = {b.name for b in group}
+        original = f"{stem}.jpeg"
+        if original not in names or not VARIANT_SOURCE.match(original):
+            continue
+        report["originals"] += 1
+        for ext, _ in formats:
+            if variant_path(original, ext) in names:
+                _mark_variant(variant_path(original, ext))
+        if all(variant_path(original, ext) in names for ext, _ in formats):
+            continue
+        if limit is not None and report["built"] + report["errors"] >= limit:
+            continue
+        try:
+            build_variants(original)
+            report["built"] += 1
+        except Exception as e:
+            report["errors"] += 1
+            logger.error(f"❌ Failed to build variants of {original}: {e}")
+    return report
+
+
+def init_image_variants(app):
+    @app.cli.command("build-variants")
+    @click.option("--prefix", default="storage/", show_default=True, help="Only scan objects under this prefix.")
+    @click.option("--limit", type=int, default=None, help="Build at most this many originals.")
+    def build_variants_command(prefix, limit):
+        """Build the AVIF/WebP variants of stored originals that lack them."""
+        for key, value in build_missing_variants(prefix, limit).items():
+            print(f"{key}: {value}")
+
+
+def delete_variants(blob_path: str):
+    """
+    Remove everything derived from an original that is being deleted:
+    format variants and resized copies, all named <id>.<something>.
+    """
+    prefix = f"{os.path.splitext(blob_path)[0]}."
+    try:
+        with track("gcs", "list"):
+            derived = [b for b in bucket.list_blobs(prefix=prefix) if b.name != blob_path]
+    except Exception as e:
+        logger.error(f"❌ Failed to list variants of {blob_path}: {e}")
+        return
+    for blob in derived:
+        cache.delete(f"variant:{blob.name}")
+        try:
+            with track("gcs", "delete"):
+                blob.delete()
+        except NotFound:
+            pass
+        except Exception as e:
+            logger.error(f"❌ Failed to delete variant {blob.name}: {e}")
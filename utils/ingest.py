@@ -0,0 +1,134 @@
+import io
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from extensions import supabase_admin, upload_to_gcs, logger
+from utils.basket_import import safe_get
+from utils.image_variants import VARIANT_SOURCE, schedule_variants
+from utils.job_status import update_statuses
+from utils.metrics import track, inc
+from utils.tracing import log_stage, seconds_since, parse_timestamp
+
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", 8))
+INGEST_MAX_ITEMS = int(os.getenv("INGEST_MAX_ITEMS", 100))
+FETCH_TIMEOUT = 30
+# storage/<email>/generated_images + <job id>.jpeg, as sent by the SaveImage node.
+GENERATED_FOLDER = re.compile(r"^storage/(?P<email>[^/]+)/generated_images$")
+
+def validate_item(item):
+    if not isinstance(item, dict):
+        return "Item must be an object"
+    if not item.get("image_url"):
+        return "Missing image URL"
+    if not item.get("folder") or not item.get("filename"):
+        return "Missing folder or filename"
+    return None
+
+
+def ingest_one(item):
+    """
+    Fetch one generated image and store it in GCS; its variants are queued,
+    not encoded here.
+    Items may carry trace_id, submitted_at and generated_at from the
+    workflow; they are used for the job's stage log.
+    """
+    started = time.perf_counter()
+    job_id = os.path.splitext(item["filename"])[0]
+    try:
+        # The URL comes from the caller: fetched like a basket import URL.
+        with track("runware", "fetch_image"):
+            response = safe_get(item["image_url"], timeout=FETCH_TIMEOUT)
+        if response.status_code != 200:
+            raise ValueError(f"Failed to fetch image: {response.status_code}")
+
+        folder = item["folder"].strip("/")
+        filename = item["filename"]
+        url = upload_to_gcs(io.BytesIO(response.content), folder, filename)
+        if VARIANT_SOURCE.match(f"{folder}/{filename}"):
+            schedule_variants(f"{folder}/{filename}")
+    except Exception as e:
+        log_stage("ingest", trace_id=item.get("trace_id"), job_id=job_id, error=e)
+        raise
+
+    submitted_at = item.get("submitted_at")
+    generated_at = parse_timestamp(item.get("generated_at")) if item.get("generated_at") else None
+    generation = seconds_since(submitted_at, until=generated_at) if generated_at else None
+    log_stage(
+        "ingest",
+        trace_id=item.get("trace_id"),
+        job_id=job_id,
+        durations={
+            "queue_and_generation": generation,
+            "ingest": time.perf_counter() - started,
+            "end_to_end": seconds_since(submitted_at),
+        },
+        bytes=len(response.content),
+    )
+    return url
+
+
+def job_row(item, url):
+    """generated_images row for an ingested item, or None if it is not a job image."""
+    match = GENERATED_FOLDER.match(item["folder"].strip("/"))
+    job_id, ext = os.path.splitext(item["filename"])
+    if not match or ext != ".jpeg":
+        return None
+    return {"id": job_id, "email": match.group("email"), "url": url, "status": "completed"}
+
+
+def ingest_batch(items):
+    """
+    Ingest many images with bounded parallelism, then mark the matching
+    generated_images rows completed in one update.
+    Returns one result per item, in request order.
+    """
+    results = [None] * len(items)
+    pending = []
+    for i, item in enumerate(items):
+        error = validate_item(item)
+        if error:
+            results[i] = {"success": False, "error": error}
+        else:
+            pending.append(i)
+
+    app = current_app._get_current_object()
+
+    def run(i):
+        # Workers need an app context for the shared cache.
+        with app.app_context():
+            try:
+                url = ingest_one(items[i])
+            except Exception as e:
+                logger.error(f"❌ Failed to ingest {items[i].get('filename')}: {e}")
+                return i, {"success": False, "filename": items[i]["filename"], "error": str(e)}
+            return i, {"success": True, "filename": items[i]["filename"], "url": url}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(INGEST_CONCURRENCY, len(pending)))) as pool:
+        for i, result in pool.map(run, pending):
+            results[i] = result
+
+    jobs = {}  # {item index: generated_images row}
+    for i in pending:
+        if results[i]["success"]:
+            row = job_row(items[i], results[i]["url"])
+            if row:
+                jobs[i] = row
+    if jobs:
+        try:
+            matched = update_statuses(list({(r["id"], r["email"]): r for r in jobs.values()}.values()))
+            for i, row in jobs.items():
+                if row["id"] not in matched:
+                    results[i]["warning"] = "Stored, but no matching job to complete"
+        except Exception as e:
+            logger.error(f"❌ Failed to complete {len(jobs)} job(s) after ingest: {e}")
+            for i in jobs:
+                results[i]["warning"] = "Stored, but the job status was not updated"
+
+    ok = sum(1 for r in results if r["success"])
+    inc("ingest_items_total", amount=ok, result="success")
+    inc("ingest_items_total", amount=len(results) - ok, result="error")
+    return results
@@ -0,0 +1,87 @@
+import base64
+import json
+import uuid
+from datetime import date, datetime, timedelta
+
+from extensions import supabase_admin
+from utils.job_status import STATUSES
+
+JOB_COLUMNS = "id, created_at, email, prompt, status, message"
+MAX_SEARCH_LIMIT = 100
+FILTER_ARGS = ("q", "status", "from", "to")
+
+
+class SearchError(ValueError):
+    pass
+
+
+def encode_cursor(row, column="created_at"):
+    raw = json.dumps({"t": row[column], "id": row["id"]}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        # Both values end up inside a PostgREST filter, so only accept
+        # a real timestamp and uuid.
+        created_at = datetime.fromisoformat(data["t"]).isoformat()
+        return created_at, str(uuid.UUID(data["id"]))
+    except (ValueError, KeyError, TypeError):
+        raise SearchError("Invalid cursor")
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise SearchError(f"Invalid {name} date, expected YYYY-MM-DD")
+
+
+def _like_pattern(text):
+    # Match the words as typed, anywhere in the prompt.
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{' '.join(escaped.split())}%"
+
+
+def search_jobs(email, q=None, status=None, date_from=None, date_to=None, cursor=None, limit=12):
+    """
+    One page of a user's jobs, newest first, optionally filtered by prompt
+    text, status and creation date (inclusive, YYYY-MM-DD).
+
+    Pages are keyed on (created_at, id) rather than offsets, so deep pages
+    cost the same as the first. The prompt filter is an ILIKE that the
+    generated_images_prompt_trgm_idx trigram index serves.
+    Returns (jobs, next_cursor or None).
+    """
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    query = supabase_admin.table("generated_images").select(JOB_COLUMNS).eq("email", email)
+
+    if q and q.strip():
+        query = query.ilike("prompt", _like_pattern(q))
+    if status:
+        if status not in STATUSES:
+            raise SearchError(f"Unknown status '{status}'")
+        query = query.eq("status", status)
+    if date_from:
+        query = query.gte("created_at", _parse_date(date_from, "from").isoformat())
+    if date_to:
+        end = _parse_date(date_to, "to") + timedelta(days=1)
+        query = query.lt("created_at", end.isoformat())
+    if cursor:
+        created_at, job_id = decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{job_id})'
+        )
+
+    rows = (
+        query.order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(limit + 1)
+        .execute()
+        .data
+        or []
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,182 @@
+import atexit
+import os
+import threading
+
+from extensions import cache, supabase_admin, logger
+from utils.metrics import inc, cache_result
+from utils.tracing import log_stage
+
+STATUSES = ("pending", "completed", "failed", "error")
+COUNTED_STATUSES = ("pending", "failed", "completed")
+# Per-user job counters. n8n also writes statuses straight to Supabase,
+# which the app never sees, so this bounds how stale they can get.
+STATUS_CACHE_TTL = int(os.getenv("JOB_STATUS_CACHE_TTL", 30))
+# Callback events are held this long (or until this many) before one write.
+# A serverless function is frozen once its response is sent, so on Vercel
+# they are written before the callback is answered.
+STATUS_FLUSH_INTERVAL = float(os.getenv("JOB_STATUS_FLUSH_INTERVAL", 0 if os.getenv("VERCEL") else 1.0))
+STATUS_BATCH_SIZE = int(os.getenv("JOB_STATUS_BATCH_SIZE", 100))
+
+
+def _key(email):
+    return f"job_counts:{email}"
+
+
+def _count(email, status):
+    # Answered from generated_images_email_status_created_idx.
+    return (
+        supabase_admin.table("generated_images")
+        .select("id", count="exact")
+        .eq("email", email)
+        .eq("status", status)
+        .limit(1)
+        .execute()
+        .count
+        or 0
+    )
+
+
+def status_counts(email: str) -> dict:
+    """The jobs page counters: pending, failed, completed and their total."""
+    counts = cache.get(_key(email))
+    cache_result("job_status", counts is not None)
+    if counts is None:
+        counts = {status: _count(email, status) for status in COUNTED_STATUSES}
+        counts["total"] = sum(counts.values())
+        cache.set(_key(email), counts, timeout=STATUS_CACHE_TTL)
+    return counts
+
+
+def invalidate_counts(*emails):
+    """
+    Drop cached counters once the app has changed a user's jobs. Counters
+    are only ever stored whole from fresh queries, never patched.
+    """
+    for email in set(emails):
+        cache.delete(_key(email))
+
+
+def update_statuses(rows):
+    """
+    Write many jobs' status / message / url in one call. Only a row with
+    both the id and the email given is touched, so this can neither create
+    jobs nor move one to another user. Returns the ids that matched.
+    """
+    matched = supabase_admin.rpc("update_job_statuses", {"rows": rows}).execute().data or []
+    # Only now can a fresh count see these statuses.
+    invalidate_counts(*(row["email"] for row in rows))
+    return {str(row["id"]) for row in matched}
+
+
+class StatusBuffer:
+    """
+    Collects job status events and writes them to generated_images in
+    batches through update_job_statuses, which only touches rows matching
+    both id and email. The latest event per job wins. Writes happen when the
+    batch is full or STATUS_FLUSH_INTERVAL after the first buffered event;
+    with an interval of 0 every add is written before it returns, and a
+    failed write raises to the caller instead of waiting in memory.
+    """
+
+    def __init__(self, interval=STATUS_FLUSH_INTERVAL, batch_size=STATUS_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._rows = {}  # {(job_id, email): row}
+        self._timer = None
+
+    @staticmethod
+    def _merge(target, rows):
+        for row in rows:
+            key = (row["id"], row["email"])
+            target[key] = {**target.get(key, {}), **row}
+        return target
+
+    def add(self, rows):
+        if self.interval <= 0:
+            self._write(list(self._merge({}, rows).values()))
+            return
+        with self._lock:
+            self._merge(self._rows, rows)
+            size = len(self._rows)
+            if size < self.batch_size and self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if size >= self.batch_size:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def _write(self, rows):
+        """One update for the batch. Returns the ids that matched a job."""
+        matched = update_statuses(rows)
+        inc("job_status_writes_total")
+        inc("job_status_events_written_total", amount=len(matched))
+        if len(matched) < len(rows):
+            inc("job_status_events_unmatched_total", amount=len(rows) - len(matched))
+            logger.warning(f"⚠️ {len(rows) - len(matched)} job status event(s) matched no job")
+        return matched
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = list(self._rows.values()), {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not rows:
+                return 0
+            try:
+                return len(self._write(rows))
+            except Exception as e:
+                logger.error(f"❌ Failed to write {len(rows)} job status event(s): {e}")
+                self._requeue(rows)
+                return 0
+
+    def _requeue(self, rows):
+        with self._lock:
+            for row in rows:
+                # Keep anything newer that arrived during the failed write.
+                key = (row["id"], row["email"])
+                self._rows[key] = {**row, **self._rows.get(key, {})}
+            if self._timer is None:
+                self._timer = threading.Timer(max(self.interval, 5), self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+
+status_buffer = StatusBuffer()
+atexit.register(status_buffer.flush)
+
+
+def record_events(events):
+    """
+    Validate callback events and queue the database write; cached counters
+    are dropped once it lands. Returns (accepted rows, errors). Without a
+    flush interval the write happens here, and a failure raises.
+    """
+    rows, errors = [], []
+    for i, event in enumerate(events):
+        if not isinstance(event, dict) or not event.get("id") or not event.get("email"):
+            errors.append({"index": i, "error": "Missing id or email"})
+            continue
+        if event.get("status") not in STATUSES:
+            errors.append({"index": i, "error": f"Unknown status {event.get('status')!r}"})
+            continue
+        row = {"id": str(event["id"]), "email": event["email"], "status": event["status"]}
+        for field in ("message", "url"):
+            if event.get(field) is not None:
+                row[field] = event[field]
+        rows.append(row)
+        if event.get("trace_id"):
+            log_stage("status", str(event["trace_id"]), row["id"], status=row["status"],
+                      error=(row.get("message") or row["status"]) if row["status"] in ("failed", "error") else None)
+
+    if rows:
+        status_buffer.add(rows)
+        inc("job_status_events_total", amount=len(rows))
+    return rows, errors
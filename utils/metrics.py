@@ -0,0 +1,280 @@
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import httpx
+
+# Histogram buckets in seconds, shared by every latency metric.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "http_request_duration_seconds": "Latency of requests handled by the app, per endpoint.",
+    "dependency_call_duration_seconds": "Latency of outbound dependency calls.",
+    "dependency_errors_total": "Outbound dependency calls that failed.",
+    "cache_requests_total": "Cache lookups by cache and result.",
+    "rate_limited_total": "Requests rejected by admission control.",
+    "ingest_items_total": "Images stored through the batch ingest endpoint, by result.",
+    "job_status_events_total": "Job status events accepted by the completion callback.",
+    "job_status_events_written_total": "Buffered job status events written to the database.",
+    "job_status_events_unmatched_total": "Job status events whose id and email matched no job.",
+    "job_status_writes_total": "Batched job status writes.",
+    "reference_derivatives_created_total": "Resized reference images written, by longest edge.",
+    "storage_orphans_found_total": "Objects without a database row found by reconcile-storage.",
+    "basket_import_images_total": "Images brought into baskets by bulk imports, by result.",
+    "admin_bulk_users_total": "Users updated by bulk admin actions, by action and result.",
+    "background_tasks_total": "Deferred background tasks, by task and result.",
+    "background_task_wait_seconds": "Time background tasks spent queued before running.",
+    "job_stage_duration_seconds": "Time spent in each stage of a job, from submit through generation to ingest.",
+    "image_variants_created_total": "AVIF/WebP image variants encoded, by format and trigger.",
+}
+
+# Each thread records into its own shard, so recording never contends on a
+# lock. Shards are only merged when /metrics is scraped. When a thread
+# exits its shard is folded into _retired, so short-lived threads (request
+# threads, pools) neither leak shards nor lose their counts.
+_local = threading.local()
+_shards = []
+_retired = {"histograms": {}, "counters": {}}
+# Reentrant: a shard can be retired by garbage collection on a thread that
+# already holds it.
+_shards_lock = threading.RLock()
+
+
+class _ShardOwner:
+    """Lives only in the thread-local, so it is collected when its thread exits."""
+
+
+def _fold(into, shard):
+    for key, (buckets, count, total) in list(shard["histograms"].items()):
+        merged = into["histograms"].setdefault(key, [[0] * len(BUCKETS), 0, 0.0])
+        for i, n in enumerate(buckets):
+            merged[0][i] += n
+        merged[1] += count
+        merged[2] += total
+    for key, value in list(shard["counters"].items()):
+        into["counters"][key] = into["counters"].get(key, 0) + value
+
+
+def _retire(shard):
+    with _shards_lock:
+        _fold(_retired, shard)
+        _shards.remove(shard)
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = {"histograms": {}, "counters": {}}
+        owner = _ShardOwner()
+        _local.shard = shard
+        _local.owner = owner
+        with _shards_lock:
+            _shards.append(shard)
+        weakref.finalize(owner, _retire, shard)
+    return shard
+
+
+def _labels_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def observe(name: str, value: float, **labels):
+    """Record a latency sample (seconds) in a histogram."""
+    histograms = _shard()["histograms"]
+    key = _labels_key(name, labels)
+    entry = histograms.get(key)
+    if entry is None:
+        entry = histograms[key] = [[0] * len(BUCKETS), 0, 0.0]
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            entry[0][i] += 1
+            break
+    entry[1] += 1
+    entry[2] += value
+
+
+def inc(name: str, amount: int = 1, **labels):
+    counters = _shard()["counters"]
+    key = _labels_key(name, labels)
+    counters[key] = counters.get(key, 0) + amount
+
+
+def cache_result(cache: str, hit: bool):
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def record_dependency(dependency: str, operation: str, elapsed: float, error: bool = False):
+    """Record one outbound call, and add it to the timeline if one is active."""
+    observe(
+        "dependency_call_duration_seconds",
+        elapsed,
+        dependency=dependency,
+        operation=operation,
+    )
+    if error:
+        inc("dependency_errors_total", dependency=dependency, operation=operation)
+
+    timeline = getattr(_local, "timeline", None)
+    if timeline is not None:
+        timeline.append(
+            {
+                "dependency": dependency,
+                "operation": operation,
+                "start": round(time.perf_counter() - elapsed, 6),
+                "duration": round(elapsed, 6),
+                "error": error,
+            }
+        )
+
+
+def start_timeline():
+    """Collect outbound calls made by this thread until stop_timeline()."""
+    _local.timeline = []
+
+
+def stop_timeline():
+    timeline = getattr(_local, "timeline", None)
+    _local.timeline = None
+    return timeline or []
+
+
+@contextmanager
+def track(dependency: str, operation: str):
+    """
+    Time an outbound call and count it as an error if it raises.
+
+        with track("gcs", "upload"):
+            blob.upload_from_file(...)
+    """
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record_dependency(dependency, operation, time.perf_counter() - started, error)
+
+
+_ID_SEGMENT = re.compile(r"^[0-9a-fA-F-]{16,}$")
+
+
+def _operation_from_url(url) -> str:
+    # /rest/v1/generated_images -> generated_images, /auth/v1/admin/users/<id> -> admin/users
+    parts = [p for p in url.path.split("/") if p]
+    if len(parts) > 2 and parts[1].startswith("v"):
+        parts = parts[2:]
+    parts = [p for p in parts if not _ID_SEGMENT.match(p)]
+    return "/".join(parts[:2]) or "/"
+
+
+class _ErrorCountingTransport(httpx.BaseTransport):
+    """
+    Counts connection errors and timeouts, which never reach the response
+    hook, as dependency errors.
+    """
+
+    def __init__(self, transport, dependency):
+        self._transport = transport
+        self._dependency = dependency
+
+    def handle_request(self, request):
+        try:
+            return self._transport.handle_request(request)
+        except httpx.TransportError:
+            started = request.extensions.get("metrics_started", time.perf_counter())
+            record_dependency(
+                self._dependency,
+                f"{request.method} {_operation_from_url(request.url)}",
+                time.perf_counter() - started,
+                error=True,
+            )
+            raise
+
+    def close(self):
+        self._transport.close()
+
+
+def instrument_httpx_client(http_client, dependency: str):
+    """
+    Add timing and error counting to an httpx.Client through its event hooks
+    and transport. Used for the clients inside the Supabase SDK.
+    """
+
+    def on_request(request):
+        request.extensions["metrics_started"] = time.perf_counter()
+
+    def on_response(response):
+        request = response.request
+        started = request.extensions.get("metrics_started")
+        if started is None:
+            return
+        record_dependency(
+            dependency,
+            f"{request.method} {_operation_from_url(request.url)}",
+            time.perf_counter() - started,
+            error=response.status_code >= 500 or response.status_code == 429,
+        )
+
+    http_client.event_hooks["request"].append(on_request)
+    http_client.event_hooks["response"].append(on_response)
+    # httpx has no hook for failed requests; wrap the transports instead.
+    http_client._transport = _ErrorCountingTransport(http_client._transport, dependency)
+    for pattern, transport in list(http_client._mounts.items()):
+        if transport is not None:
+            http_client._mounts[pattern] = _ErrorCountingTransport(transport, dependency)
+
+
+def _merge():
+    merged = {"histograms": {}, "counters": {}}
+    with _shards_lock:
+        _fold(merged, _retired)
+        shards = list(_shards)
+    for shard in shards:
+        _fold(merged, shard)
+    return merged["histograms"], merged["counters"]
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ""
+    pairs = []
+    for k, v in items:
+        value = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{k}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    histograms, counters = _merge()
+    lines = []
+    seen = set()
+
+    for (name, labels), (buckets, count, total) in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(
+                f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}"
+            )
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
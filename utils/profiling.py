@@ -0,0 +1,170 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, request, session
+
+from extensions import cache, logger
+from utils.metrics import start_timeline, stop_timeline
+
+# Fraction of all requests to profile, e.g. 0.01 for 1%. Off by default.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_TTL = int(os.getenv("PROFILE_TTL", 24 * 60 * 60))
+PROFILE_KEEP = 50
+PROFILE_INDEX_KEY = "profiles:index"
+# Raw Redis list used instead when the cache is Redis.
+PROFILE_INDEX_LIST = "profiles:index:list"
+
+# Only one cProfile profiler can be active per process (Python 3.12+ raises
+# ValueError otherwise), so concurrent flagged requests skip profiling.
+_profiler_lock = threading.Lock()
+# Guards the index read-modify-write when the cache is not Redis.
+_index_lock = threading.Lock()
+
+
+def _redis():
+    return getattr(cache.cache, "_write_client", None)
+
+
+def _push_index(profile_id):
+    client = _redis()
+    if client is not None:
+        # Atomic across processes: newest first, trimmed to PROFILE_KEEP.
+        pipe = client.pipeline()
+        pipe.lpush(PROFILE_INDEX_LIST, profile_id)
+        pipe.ltrim(PROFILE_INDEX_LIST, 0, PROFILE_KEEP - 1)
+        pipe.expire(PROFILE_INDEX_LIST, PROFILE_TTL)
+        pipe.execute()
+        return
+    with _index_lock:
+        index = cache.get(PROFILE_INDEX_KEY) or []
+        index.insert(0, profile_id)
+        cache.set(PROFILE_INDEX_KEY, index[:PROFILE_KEEP], timeout=PROFILE_TTL)
+
+
+def _read_index():
+    client = _redis()
+    if client is not None:
+        return [
+            value.decode() if isinstance(value, bytes) else value
+            for value in client.lrange(PROFILE_INDEX_LIST, 0, PROFILE_KEEP - 1)
+        ]
+    return cache.get(PROFILE_INDEX_KEY) or []
+
+
+def _requested_by_admin():
+    if not session.get("is_admin"):
+        return False
+    return (
+        request.headers.get("X-Profile") == "1"
+        or request.args.get("__profile") == "1"
+    )
+
+
+def start_profiling():
+    """before_request hook: start a profile for flagged or sampled requests."""
+    if _requested_by_admin():
+        trigger = "admin"
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        trigger = "sample"
+    else:
+        return None
+
+    if not _profiler_lock.acquire(blocking=False):
+        logger.info(f"Skipping {trigger} profile of {request.path}: another request is being profiled")
+        return None
+    try:
+        profiler = cProfile.Profile()
+        g.profile = {"profiler": profiler, "trigger": trigger, "started": time.perf_counter()}
+        start_timeline()
+        profiler.enable()
+    except Exception:
+        g.pop("profile", None)
+        stop_timeline()
+        _profiler_lock.release()
+        raise
+    return None
+
+
+def _stop(state):
+    """Disable the profiler and free the process-wide slot, once."""
+    if state.get("stopped"):
+        return
+    state["stopped"] = True
+    try:
+        state["profiler"].disable()
+    finally:
+        _profiler_lock.release()
+
+
+def finish_profiling(response):
+    """after_request hook: stop the profiler and store the result."""
+    state = g.pop("profile", None)
+    if state is None:
+        return response
+
+    _stop(state)
+    duration = time.perf_counter() - state["started"]
+    timeline = stop_timeline()
+    for call in timeline:
+        call["start"] = round(call["start"] - state["started"], 6)
+
+    out = io.StringIO()
+    stats = pstats.Stats(state["profiler"], stream=out)
+    stats.sort_stats("cumulative").print_stats(40)
+
+    profile_id = uuid.uuid4().hex
+    record = {
+        "id": profile_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "trigger": state["trigger"],
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "duration": round(duration, 4),
+        "user": session.get("user"),
+        "timeline": timeline,
+        "stats": out.getvalue(),
+    }
+    try:
+        cache.set(f"profile:{profile_id}", record, timeout=PROFILE_TTL)
+        _push_index(profile_id)
+    except Exception as e:
+        logger.error(f"❌ Failed to store profile: {e}")
+
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def list_profiles():
+    profiles = []
+    for profile_id in _read_index():
+        record = cache.get(f"profile:{profile_id}")
+        if record:
+            profiles.append(record)
+    return profiles
+
+
+def get_profile(profile_id):
+    return cache.get(f"profile:{profile_id}")
+
+
+def abandon_profiling(exc=None):
+    """teardown hook: stop a profile whose response never reached after_request."""
+    state = g.pop("profile", None)
+    if state is not None:
+        _stop(state)
+        stop_timeline()
+
+
+def init_profiling(app):
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+    app.teardown_request(abandon_profiling)
@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import request, session, jsonify, Response
+
+from extensions import cache, logger
+from utils.metrics import inc
+
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "TRUE").upper() == "TRUE"
+# Safety expiry for concurrency slots, in case a worker dies mid-request.
+CONCURRENCY_SLOT_TTL = 15 * 60
+# Proxies in front of the app that append to X-Forwarded-For. The client
+# address is the entry the outermost of them added; anything to its left is
+# whatever the client sent. 0 means not behind a proxy: use the peer address.
+# Vercel's edge is one hop.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 1 if os.getenv("VERCEL") else 0))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Atomic token bucket for Redis: KEYS[1] = bucket, ARGV = rate, burst, now.
+# Returns {allowed, seconds until a token is available (x1000)}.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, math.ceil(wait * 1000)}
+"""
+
+_local_lock = threading.Lock()
+_local_buckets = {}  # {key: (tokens, ts)}
+_local_slots = {}  # {key: count}
+
+
+def parse_rate(value: str):
+    """'10/minute' -> (refill per second, burst)."""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(second|minute|hour|day)\s*", value)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {value}")
+    count, period = int(match.group(1)), PERIODS[match.group(2)]
+    return count / period, count
+
+
+def _redis():
+    # Shared state when the app cache is Redis, in-process otherwise.
+    return getattr(cache.cache, "_write_client", None)
+
+
+def take_token(key: str, rate: float, burst: int):
+    """Consume one token from a bucket. Returns (allowed, retry_after seconds)."""
+    now = time.time()
+    client = _redis()
+    if client is not None:
+        allowed, wait_ms = client.eval(TOKEN_BUCKET_LUA, 1, key, rate, burst, now)
+        return bool(allowed), wait_ms / 1000
+
+    with _local_lock:
+        if len(_local_buckets) > 10000:
+            # Forget buckets idle for an hour; they would be full again anyway.
+            for stale in [k for k, (_, t) in _local_buckets.items() if now - t > 3600]:
+                del _local_buckets[stale]
+        tokens, ts = _local_buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        if tokens >= 1:
+            _local_buckets[key] = (tokens - 1, now)
+            return True, 0
+        _local_buckets[key] = (tokens, now)
+        return False, (1 - tokens) / rate
+
+
+def acquire_slot(key: str, limit: int) -> bool:
+    client = _redis()
+    if client is not None:
+        count = client.incr(key)
+        client.expire(key, CONCURRENCY_SLOT_TTL)
+        if count > limit:
+            client.decr(key)
+            return False
+        return True
+
+    with _local_lock:
+        if _local_slots.get(key, 0) >= limit:
+            return False
+        _local_slots[key] = _local_slots.get(key, 0) + 1
+        return True
+
+
+def release_slot(key: str):
+    client = _redis()
+    if client is not None:
+        client.decr(key)
+        return
+    with _local_lock:
+        _local_slots[key] = max(_local_slots.get(key, 1) - 1, 0)
+
+
+def client_ip():
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = [part.strip() for part in request.headers.get("X-Forwarded-For", "").split(",")]
+        forwarded = [part for part in forwarded if part]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.remote_addr or "unknown"
+
+
+def _release_all(keys):
+    for key in keys:
+        try:
+            release_slot(key)
+        except Exception as e:
+            logger.error(f"❌ Failed to release concurrency slot: {e}")
+
+
+def _too_many(message, retry_after):
+    response = jsonify({"success": False, "error": message, "message": message})
+    response.headers["Retry-After"] = str(max(int(retry_after + 0.999), 1))
+    return response, 429
+
+
+def rate_limit(name: str, per_user: str = None, per_ip: str = None,
+               concurrency_per_user: int = None, concurrency: int = None):
+    """
+    Token-bucket admission control for an endpoint.
+
+    per_user / per_ip take rates like "10/minute". concurrency_per_user and
+    concurrency cap how many of these requests run at once, per user and in
+    total. Over-limit requests get 429 with Retry-After.
+    """
+    user_rate = parse_rate(per_user) if per_user else None
+    ip_rate = parse_rate(per_ip) if per_ip else None
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not RATE_LIMITS_ENABLED:
+                return f(*args, **kwargs)
+
+            user_id = session.get("user_id")
+            checks = []
+            if user_rate and user_id:
+                checks.append((f"ratelimit:{name}:user:{user_id}", user_rate))
+            if ip_rate:
+                checks.append((f"ratelimit:{name}:ip:{client_ip()}", ip_rate))
+
+            try:
+                for key, (rate, burst) in checks:
+                    allowed, retry_after = take_token(key, rate, burst)
+                    if not allowed:
+                        inc("rate_limited_total", endpoint=name, reason="rate")
+                        return _too_many("Too many requests. Please slow down.", retry_after)
+            except Exception as e:
+                # Fail open: an unreachable limiter must not take the app down.
+                logger.error(f"❌ Rate limiter unavailable: {e}")
+
+            slots = []
+            if concurrency_per_user and user_id:
+                slots.append((f"concurrency:{name}:user:{user_id}", concurrency_per_user))
+            if concurrency:
+                slots.append((f"concurrency:{name}:all", concurrency))
+
+            held = []
+            try:
+                for key, limit in slots:
+                    try:
+                        acquired = acquire_slot(key, limit)
+                    except Exception as e:
+                        logger.error(f"❌ Concurrency limiter unavailable: {e}")
+                        continue
+                    if not acquired:
+                        inc("rate_limited_total", endpoint=name, reason="concurrency")
+                        return _too_many("This operation is already running. Try again shortly.", 10)
+                    held.append(key)
+                rv = f(*args, **kwargs)
+                if held and isinstance(rv, Response) and rv.is_streamed:
+                    # The work happens while the body is sent: hold the
+                    # slots until the server closes the response.
+                    keys, held = held, []
+                    rv.call_on_close(lambda: _release_all(keys))
+                return rv
+            finally:
+                _release_all(held)
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,176 @@
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from google.api_core.exceptions import NotFound
+
+from extensions import bucket, supabase_admin, logger
+from utils.metrics import track, inc
+
+# storage/<email>/<folder>/<id>.<suffix> — originals, variants and resized copies.
+OBJECT_NAME = re.compile(r"^storage/(?P<email>[^/]+)/(?P<folder>[^/]+)/(?P<id>[^/.]+)(?P<suffix>\..+)$")
+PLACEHOLDER_NAME = re.compile(r"^storage/(?P<email>[^/]+)(/[^/]+)?/\.placeholder$")
+TABLES = {"generated_images": "generated_images", "my_images": "my_images"}
+ROW_PAGE_SIZE = 1000
+LIST_PAGE_SIZE = 1000
+SAMPLE_SIZE = 20
+# GCS accepts at most this many calls in one batch request.
+GCS_MAX_BATCH = 100
+
+
+def _row_ids(table, email):
+    """Ids of a user's rows, read in pages ordered by id."""
+    ids, start = set(), 0
+    while True:
+        rows = (
+            supabase_admin.table(table)
+            .select("id")
+            .eq("email", email)
+            .order("id")
+            .range(start, start + ROW_PAGE_SIZE - 1)
+            .execute()
+            .data
+            or []
+        )
+        ids.update(str(row["id"]) for row in rows)
+        if len(rows) < ROW_PAGE_SIZE:
+            return ids
+        start += ROW_PAGE_SIZE
+
+
+class Reconciler:
+    """
+    Finds objects under storage/ with no matching my_images / generated_images
+    row, and optionally deletes them.
+
+    The bucket listing is streamed in name order, so each user's objects
+    arrive together; only that user's row ids are held in memory at a time.
+    Objects newer than the grace period are skipped, since uploads land
+    before their rows are written. Browser uploads that were never
+    finalized have no my_images row, so they are swept like any orphan.
+    """
+
+    def __init__(self, delete=False, batch_size=100, grace=timedelta(hours=1), prefix="storage/"):
+        self.delete = delete
+        self.batch_size = max(1, min(batch_size, GCS_MAX_BATCH))
+        self.cutoff = datetime.now(timezone.utc) - grace
+        self.prefix = prefix
+        self.report = {
+            "mode": "delete" if delete else "dry-run",
+            "objects_scanned": 0,
+            "users_scanned": 0,
+            "orphans": {"generated_images": 0, "my_images": 0, "placeholder": 0},
+            "orphan_bytes": 0,
+            "deleted": 0,
+            "delete_errors": 0,
+            "unrecognized": 0,
+            "skipped_recent": 0,
+            "samples": [],
+        }
+        self._email = None
+        self._ids = {}
+        self._batch = []
+
+    def run(self):
+        started = time.monotonic()
+        with track("gcs", "list"):
+            blobs = bucket.list_blobs(prefix=self.prefix, page_size=LIST_PAGE_SIZE)
+        for blob in blobs:
+            self._check(blob)
+        self._flush()
+        self.report["seconds"] = round(time.monotonic() - started, 2)
+        return self.report
+
+    def _known_ids(self, email, table):
+        if email != self._email:
+            self._email, self._ids = email, {}
+            self.report["users_scanned"] += 1
+        if table not in self._ids:
+            self._ids[table] = _row_ids(table, email)
+        return self._ids[table]
+
+    def _check(self, blob):
+        self.report["objects_scanned"] += 1
+        if self.report["objects_scanned"] % 10000 == 0:
+            logger.info(f"🔎 Reconcile: {self.report['objects_scanned']} objects scanned")
+
+        if PLACEHOLDER_NAME.match(blob.name):
+            # Folder markers earlier releases wrote at registration; GCS
+            # has no folders to keep and nothing creates them any more.
+            self._orphan(blob, "placeholder")
+            return
+
+        match = OBJECT_NAME.match(blob.name)
+        if not match or match.group("folder") not in TABLES:
+            self.report["unrecognized"] += 1
+            return
+        if blob.updated and blob.updated > self.cutoff:
+            self.report["skipped_recent"] += 1
+            return
+
+        table = TABLES[match.group("folder")]
+        if match.group("id") not in self._known_ids(match.group("email"), table):
+            self._orphan(blob, table)
+
+    def _orphan(self, blob, kind):
+        self.report["orphans"][kind] += 1
+        self.report["orphan_bytes"] += blob.size or 0
+        if len(self.report["samples"]) < SAMPLE_SIZE:
+            self.report["samples"].append(blob.name)
+        inc("storage_orphans_found_total", kind=kind)
+        if self.delete:
+            self._batch.append(blob)
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        client = getattr(bucket, "client", None)
+        if client is not None and len(batch) > 1:
+            # One HTTP round trip for the whole batch.
+            try:
+                with track("gcs", "delete_batch"):
+                    with client.batch():
+                        for blob in batch:
+                            blob.delete()
+                self.report["deleted"] += len(batch)
+                batch = []
+            except Exception as e:
+                logger.warning(f"⚠️ Batch delete failed, retrying one by one: {e}")
+
+        for blob in batch:
+            try:
+                with track("gcs", "delete"):
+                    blob.delete()
+                self.report["deleted"] += 1
+            except NotFound:
+                self.report["deleted"] += 1  # Removed by the failed batch.
+            except Exception as e:
+                self.report["delete_errors"] += 1
+                logger.error(f"❌ Failed to delete orphan {blob.name}: {e}")
+        logger.info(f"🗑️ Reconcile: deleted {self.report['deleted']} orphan(s) so far")
+
+
+def reconcile_storage(delete=False, batch_size=100, grace_hours=1.0, prefix="storage/"):
+    """Run one reconciliation pass and return its report."""
+    return Reconciler(delete, batch_size, timedelta(hours=grace_hours), prefix).run()
+
+
+def init_reconcile(app):
+    @app.cli.command("reconcile-storage")
+    @click.option("--delete", is_flag=True, help="Delete orphans instead of only reporting them.")
+    @click.option("--batch-size", default=100, show_default=True, help="Orphans deleted per batch.")
+    @click.option("--grace-hours", default=1.0, show_default=True, help="Skip objects newer than this.")
+    @click.option("--prefix", default="storage/", show_default=True, help="Only scan objects under this prefix.")
+    def reconcile_storage_command(delete, batch_size, grace_hours, prefix):
+        """Find (and optionally delete) objects with no database row."""
+        report = reconcile_storage(delete, batch_size, grace_hours, prefix)
+        for key, value in report.items():
+            if key != "samples":
+                print(f"{key}: {value}")
+        for name in report["samples"]:
+            print(f"  orphan: {name}")
@@ -0,0 +1,142 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from google.api_core.exceptions import NotFound
+
+from extensions import bucket, cache, logger, upload_to_gcs
+from utils.background import background_task
+from utils.image_variants import Image, STORAGE_LINK
+from utils.metrics import track, inc, cache_result
+
+REFERENCE_DERIVATIVES = os.getenv("REFERENCE_DERIVATIVES", "TRUE").upper() == "TRUE"
+# Longest edge of the copies sent to the generator, per requested size.
+REFERENCE_EDGES = (512, 768, 1024, 1536, 2048)
+# Built as soon as an image lands in the basket; other sizes on demand.
+REFERENCE_PREWARM_EDGE = int(os.getenv("REFERENCE_PREWARM_EDGE", 1024))
+REFERENCE_QUALITY = 90
+REFERENCE_CACHE_TTL = 24 * 60 * 60
+# After a failed lookup or resize the original is used for a while, instead
+# of every submit retrying the same download and decode.
+REFERENCE_FAILURE_TTL = 5 * 60
+
+
+def reference_edge(width: int, height: int) -> int:
+    """Smallest bucket that covers the requested output size."""
+    longest = max(int(width or 0), int(height or 0))
+    return next((edge for edge in REFERENCE_EDGES if edge >= longest), REFERENCE_EDGES[-1])
+
+
+def reference_path(email: str, image_id: str, edge: int) -> str:
+    """Stored next to the original: <id>.jpeg -> <id>.ref1024.jpeg"""
+    return f"storage/{email}/my_images/{image_id}.ref{edge}.jpeg"
+
+
+def _public_url(blob_path: str) -> str:
+    return f"{STORAGE_LINK}/{blob_path[len('storage/'):]}"
+
+
+def resize_reference(data: bytes, edge: int):
+    """JPEG bytes fitted inside edge x edge, or None if already small enough."""
+    with Image.open(io.BytesIO(data)) as img:
+        if max(img.size) <= edge:
+            return None
+        img = img.convert("RGB")
+        img.thumbnail((edge, edge), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=REFERENCE_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def _store(email, image_id, edge, data):
+    """Write the derivative if one is needed; remember which URL to use."""
+    original = f"storage/{email}/my_images/{image_id}.jpeg"
+    with track("images", "resize_reference"):
+        resized = resize_reference(data, edge)
+    if resized is None:
+        path = original
+    else:
+        path = reference_path(email, image_id, edge)
+        folder, filename = path.rsplit("/", 1)
+        upload_to_gcs(io.BytesIO(resized), folder, filename)
+        inc("reference_derivatives_created_total", edge=edge)
+    cache.set(f"refimg:{email}:{image_id}:{edge}", path, timeout=REFERENCE_CACHE_TTL)
+    return path
+
+
+def prewarm_reference(email: str, image_id: str, data: bytes):
+    """Best effort: build the default-size derivative for a new basket image."""
+    if not REFERENCE_DERIVATIVES or Image is None:
+        return
+    try:
+        _store(email, image_id, REFERENCE_PREWARM_EDGE, data)
+    except Exception as e:
+        logger.error(f"❌ Failed to prepare reference image {image_id}: {e}")
+
+
+@background_task
+def build_reference(email: str, image_id: str):
+    """prewarm_reference for an image already in the bucket, off the request."""
+    if not REFERENCE_DERIVATIVES or Image is None:
+        return
+    try:
+        with track("gcs", "fetch"):
+            data = bucket.blob(f"storage/{email}/my_images/{image_id}.jpeg").download_as_bytes()
+    except NotFound:
+        return
+    try:
+        _store(email, image_id, REFERENCE_PREWARM_EDGE, data)
+    except (OSError, ValueError) as e:
+        # Not a decodable image; retrying will not change that.
+        logger.warning(f"⚠️ Cannot prepare reference image {image_id}: {e}")
+
+
+def reference_url(email: str, image_id: str, width: int, height: int) -> str:
+    """
+    Public URL of the reference image to send to the generator: the resized
+    copy for this output size, built on first use, or the original.
+    """
+    original = f"storage/{email}/my_images/{image_id}.jpeg"
+    if not REFERENCE_DERIVATIVES or Image is None:
+        return _public_url(original)
+
+    edge = reference_edge(width, height)
+    key = f"refimg:{email}:{image_id}:{edge}"
+    path = cache.get(key)
+    cache_result("reference_image", path is not None)
+    if path:
+        return _public_url(path)
+
+    try:
+        derivative = reference_path(email, image_id, edge)
+        with track("gcs", "get_blob"):
+            exists = bucket.get_blob(derivative) is not None
+        if exists:
+            cache.set(key, derivative, timeout=REFERENCE_CACHE_TTL)
+            return _public_url(derivative)
+        with track("gcs", "fetch"):
+            data = bucket.blob(original).download_as_bytes()
+        return _public_url(_store(email, image_id, edge, data))
+    except Exception as e:
+        logger.error(f"❌ Using original reference image {image_id}: {e}")
+        try:
+            cache.set(key, original, timeout=REFERENCE_FAILURE_TTL)
+        except Exception:
+            pass
+        return _public_url(original)
+
+
+def reference_urls(email: str, image_ids, width: int, height: int):
+    """reference_url for several images at once, in order."""
+    if len(image_ids) <= 1:
+        return [reference_url(email, image_id, width, height) for image_id in image_ids]
+    app = current_app._get_current_object()
+
+    def resolve(image_id):
+        # Workers need an app context for the shared cache.
+        with app.app_context():
+            return reference_url(email, image_id, width, height)
+
+    with ThreadPoolExecutor(max_workers=min(len(image_ids), 8)) as pool:
+        return list(pool.map(resolve, image_ids))
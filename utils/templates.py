@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+from hashlib import sha1
+
+from jinja2 import FileSystemBytecodeCache
+
+from extensions import logger
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join(ROOT_DIR, ".jinja_cache"))
+JINJA_BYTECODE_CACHE = os.getenv("JINJA_BYTECODE_CACHE", "TRUE").upper() == "TRUE"
+
+
+class ReadOnlySafeBytecodeCache(FileSystemBytecodeCache):
+    """
+    Bytecode cache that keeps working on a read-only filesystem (e.g. a
+    serverless bundle): precompiled entries are still read, failed writes
+    are ignored.
+
+    Entries are keyed on the template name only. Jinja's default key also
+    hashes the absolute path, which differs between the build machine and
+    the runtime, so nothing precompiled would ever be found. A changed
+    template is still recompiled: each entry carries its source checksum.
+    """
+
+    def get_cache_key(self, name, filename=None):
+        return sha1(name.encode("utf-8")).hexdigest()
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def init_template_cache(app):
+    """Serve compiled templates from the on-disk bytecode cache."""
+    if not JINJA_BYTECODE_CACHE:
+        return
+    cache_dir = JINJA_CACHE_DIR
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            # Nothing was precompiled and the bundle is read-only.
+            cache_dir = os.path.join(tempfile.gettempdir(), "jinja_cache")
+            os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_options = {
+        **app.jinja_options,
+        "bytecode_cache": ReadOnlySafeBytecodeCache(cache_dir),
+    }
+
+    @app.cli.command("precompile-templates")
+    def precompile_templates_command():
+        """Compile every template into the bytecode cache."""
+        count, seconds = precompile_templates(app)
+        print(f"Precompiled {count} template(s) into {cache_dir} in {seconds:.2f}s")
+
+
+def precompile_templates(app):
+    """
+    Compile every template under templates/ so the bytecode cache is warm
+    before the first request. Returns (count, seconds).
+    """
+    started = time.perf_counter()
+    env = app.jinja_env
+    count = 0
+    for name in env.list_templates(extensions=["html"]):
+        try:
+            env.get_template(name)
+            count += 1
+        except Exception as e:
+            logger.error(f"❌ Failed to compile template {name}: {e}")
+    return count, time.perf_counter() - started
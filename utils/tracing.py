@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import re
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+from flask import g, request, has_request_context
+
+from utils.metrics import observe
+
+# Fraction of traces whose stage logs are written, e.g. 0.1 for 10%.
+# The choice is made per trace id, so a sampled job is logged at every stage.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.1))
+TRACE_HEADER = "X-Request-ID"
+# Ids taken from the edge are only trusted if they look like ids.
+_VALID_ID = re.compile(r"^[A-Za-z0-9._:-]{8,128}$")
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-(?P<trace>[0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+trace_logger = logging.getLogger("trace")
+trace_logger.setLevel(logging.INFO)
+
+
+def incoming_trace_id():
+    """The caller's trace id (X-Request-ID, then W3C traceparent), or None."""
+    candidate = request.headers.get(TRACE_HEADER)
+    if candidate and _VALID_ID.match(candidate):
+        return candidate
+    match = _TRACEPARENT.match(request.headers.get("traceparent", ""))
+    return match.group("trace") if match else None
+
+
+def adopt_trace_id(candidate):
+    """Continue a trace whose id arrived in the body rather than the headers."""
+    if candidate and _VALID_ID.match(str(candidate)):
+        g.trace_id = str(candidate)
+    return current_trace_id()
+
+
+def current_trace_id():
+    if has_request_context() and "trace_id" in g:
+        return g.trace_id
+    return None
+
+
+def start_trace():
+    """before_request hook: adopt the caller's trace id or start a new one."""
+    g.trace_id = incoming_trace_id() or uuid.uuid4().hex
+
+
+def finish_trace(response):
+    """after_request hook: echo the trace id so clients can quote it."""
+    trace_id = g.get("trace_id")
+    if trace_id:
+        response.headers[TRACE_HEADER] = trace_id
+    return response
+
+
+def trace_headers(trace_id):
+    """Headers that carry a trace to a downstream service."""
+    headers = {TRACE_HEADER: trace_id}
+    if re.fullmatch(r"[0-9a-f]{32}", trace_id):
+        headers["traceparent"] = f"00-{trace_id}-{uuid.uuid4().hex[:16]}-01"
+    return headers
+
+
+def sampled(trace_id):
+    if TRACE_SAMPLE_RATE >= 1:
+        return True
+    if not trace_id or TRACE_SAMPLE_RATE <= 0:
+        return False
+    return zlib.crc32(trace_id.encode("utf-8")) % 10000 < TRACE_SAMPLE_RATE * 10000
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def parse_timestamp(value):
+    """ISO timestamp as passed between stages (n8n sends a trailing Z), or None."""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def seconds_since(timestamp, until=None):
+    """Seconds from an ISO timestamp to `until` (a datetime) or now."""
+    started = parse_timestamp(timestamp) if timestamp else None
+    if started is None:
+        return None
+    end = until or datetime.now(timezone.utc)
+    return max((end - started).total_seconds(), 0.0)
+
+
+def log_stage(stage, trace_id=None, job_id=None, error=None, durations=None, **fields):
+    """
+    One structured log line for a stage of a job's life. Stage durations are
+    always recorded as metrics; the line itself is sampled per trace, and
+    errors are always written.
+    """
+    trace_id = trace_id or current_trace_id()
+    for name, seconds in (durations or {}).items():
+        if seconds is not None:
+            observe("job_stage_duration_seconds", seconds, stage=name)
+
+    if error is None and not sampled(trace_id):
+        return
+    record = {
+        "ts": now_iso(),
+        "stage": stage,
+        "trace_id": trace_id,
+        "job_id": job_id,
+        **{f"{name}_s": round(seconds, 3) for name, seconds in (durations or {}).items() if seconds is not None},
+        **fields,
+    }
+    if error is not None:
+        record["error"] = str(error)
+    trace_logger.log(logging.ERROR if error else logging.INFO, json.dumps(record, default=str))
+
+
+def init_tracing(app):
+    app.before_request(start_trace)
+    app.after_request(finish_trace)